@@ -0,0 +1,277 @@
+import collections
+import functools
+import sys
+import time
+from typing import NamedTuple, Optional
+
+import gymnasium as gym
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from gymnasium.vector import AsyncVectorEnv, AutoresetMode, SyncVectorEnv
+from gymnasium.wrappers import AtariPreprocessing, FrameStackObservation
+
+
+def make_atari_env(env_id: str = "PongNoFrameskip-v4"):
+    """DQN-style Atari env: 30 no-op starts, frame skip 4, 84x84 grayscale, 4 stacked frames -> (4, 84, 84) uint8."""
+    # ALE's environments are not registered with gymnasium on their own; done here
+    # so every AsyncVectorEnv worker has them, and the rest of the module runs without ALE
+    import ale_py
+    gym.register_envs(ale_py)
+
+    env = gym.make(env_id)
+    env = AtariPreprocessing(env, noop_max=30, frame_skip=4, screen_size=84, grayscale_obs=True, scale_obs=False)
+    return FrameStackObservation(env, stack_size=4)
+
+
+def make_vec_env(env_id: str = "PongNoFrameskip-v4", n_envs: int = 1):
+    """
+    n_envs copies of make_atari_env as one gymnasium vector env.
+
+    With more than one env each copy runs in its own process (AsyncVectorEnv),
+    so the emulators step in parallel while the main process runs the network.
+    Finished envs are reset within the same step call (AutoresetMode.SAME_STEP).
+    """
+    env_fns = [functools.partial(make_atari_env, env_id)] * n_envs
+    vec_env_cls = AsyncVectorEnv if n_envs > 1 else SyncVectorEnv
+    return vec_env_cls(env_fns, autoreset_mode=AutoresetMode.SAME_STEP)
+
+
+class AtariPGN(nn.Module):
+    """Convolutional policy network: stacked uint8 frames -> action logits."""
+
+    def __init__(self, input_shape, n_actions):
+        super(AtariPGN, self).__init__()
+        self.conv = nn.Sequential(
+            nn.Conv2d(input_shape[0], 32, kernel_size=8, stride=4),
+            nn.ReLU(),
+            nn.Conv2d(32, 64, kernel_size=4, stride=2),
+            nn.ReLU(),
+            nn.Conv2d(64, 64, kernel_size=3, stride=1),
+            nn.ReLU()
+        )
+        conv_out_size = self._get_conv_out(input_shape)
+        self.fc = nn.Sequential(
+            nn.Linear(conv_out_size, 512),
+            nn.ReLU(),
+            nn.Linear(512, n_actions)
+        )
+
+    def _get_conv_out(self, shape):
+        o = self.conv(torch.zeros(1, *shape))
+        return int(np.prod(o.size()))
+
+    def forward(self, x):
+        # Frames arrive as uint8 (four times less to copy than floats) and are scaled here
+        fx = x.float() / 256
+        conv_out = self.conv(fx).view(fx.size()[0], -1)
+        return self.fc(conv_out)
+
+
+class MeanBuffer:
+    """Running mean of the last `capacity` values, in O(1) per value."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.deque = collections.deque(maxlen=capacity)
+        self.sum = 0.0
+
+    def add(self, val):
+        if len(self.deque) == self.capacity:
+            self.sum -= self.deque[0]
+        self.deque.append(val)
+        self.sum += val
+
+    def mean(self):
+        if not self.deque:
+            return 0.0
+        return self.sum / len(self.deque)
+
+
+class RewardTracker:
+    """
+    Reports finished episodes (console and TensorBoard) and tells when the game is solved.
+
+    Used as a context manager around the training loop; the writer is closed on exit.
+    """
+
+    def __init__(self, writer, stop_reward, window: int = 100):
+        self.writer = writer
+        self.stop_reward = stop_reward
+        self.window = window
+
+    def __enter__(self):
+        self.ts = time.time()
+        self.ts_frame = 0
+        self.total_rewards = []
+        self.mean_rewards = MeanBuffer(self.window)
+        return self
+
+    def __exit__(self, *args):
+        self.writer.close()
+
+    def reward(self, reward, frame, epsilon=None):
+        """Record one episode's total reward at `frame`; True once the mean of the last `window` beats stop_reward."""
+        self.total_rewards.append(reward)
+        self.mean_rewards.add(reward)
+        speed = (frame - self.ts_frame) / (time.time() - self.ts)
+        self.ts_frame = frame
+        self.ts = time.time()
+        mean_reward = self.mean_rewards.mean()
+        epsilon_str = "" if epsilon is None else ", eps %.2f" % epsilon
+        print("%d: done %d games, mean reward %.3f, speed %.2f f/s%s" % (
+            frame, len(self.total_rewards), mean_reward, speed, epsilon_str
+        ))
+        sys.stdout.flush()
+        if epsilon is not None:
+            self.writer.add_scalar("epsilon", epsilon, frame)
+        self.writer.add_scalar("speed", speed, frame)
+        self.writer.add_scalar("reward_%d" % self.window, mean_reward, frame)
+        self.writer.add_scalar("reward", reward, frame)
+        if mean_reward > self.stop_reward:
+            print("Solved in %d frames!" % frame)
+            return True
+        return False
+
+
+class PolicyAgent:
+    """Samples one action per state from the softmax of the network's logits, for a whole batch of states."""
+
+    def __init__(self, net, device="cpu"):
+        self.net = net
+        self.device = device
+
+    @torch.no_grad()
+    def __call__(self, states: np.ndarray) -> np.ndarray:
+        logits = self.net(torch.from_numpy(states).to(self.device))
+        return torch.multinomial(F.softmax(logits, dim=1), 1).squeeze(1).cpu().numpy()
+
+
+class ExperienceFirstLast(NamedTuple):
+    """
+    First state and action of an n-step window, its discounted reward and the state after it.
+
+    last_state is None when the episode ended inside the window.
+    """
+    state: np.ndarray
+    action: int
+    reward: float
+    last_state: Optional[np.ndarray]
+
+
+class ExperienceSourceFirstLast:
+    """
+    n-step experience from a gymnasium vector env, one ExperienceFirstLast at a time.
+
+    Every step, the observations of all the envs go through the agent as one
+    batch and the vector env steps all of them together. The last steps_count
+    states, actions and rewards of every env live in preallocated
+    (n_envs, steps_count, ...) ring buffers; once an env's window is full, its
+    oldest step comes out with reward = sum_k gamma^k r_k over the window and the
+    observation steps_count steps later as last_state. When an episode ends,
+    the steps still in the window come out with the rewards left until the end
+    and last_state None, and the episode's total reward is queued for
+    pop_total_rewards.
+
+    Experiences of one step are rows of arrays copied out of the buffers, so
+    they can be kept (e.g. in a training batch) without being overwritten.
+    """
+
+    def __init__(self, env, agent, gamma: float, steps_count: int = 2, seed: int = None):
+        assert steps_count >= 1
+        self.env = env
+        self.agent = agent
+        self.gamma = gamma
+        self.steps_count = steps_count
+        self.seed = seed
+        self.n_envs = env.num_envs
+        # With NEXT_STEP (gymnasium's default) the step after an episode ends
+        # only resets the env, so that env's step is not a transition
+        self.next_step_reset = env.metadata.get("autoreset_mode", AutoresetMode.NEXT_STEP) == AutoresetMode.NEXT_STEP
+
+        space = env.single_observation_space
+        self._states = np.empty((self.n_envs, steps_count) + space.shape, dtype=space.dtype)
+        self._actions = np.empty((self.n_envs, steps_count), dtype=np.int64)
+        self._rewards = np.empty((self.n_envs, steps_count), dtype=np.float64)
+        self._counts = np.zeros(self.n_envs, dtype=np.int64)  # Steps of each env's current episode
+        self._discounts = gamma ** np.arange(steps_count)
+        self._window = np.arange(steps_count)
+
+        self._episode_rewards = np.zeros(self.n_envs, dtype=np.float64)
+        self._episode_steps = np.zeros(self.n_envs, dtype=np.int64)
+        self.total_rewards = []
+        self.total_steps = []
+
+    def __iter__(self):
+        obs, _ = self.env.reset(seed=self.seed)
+        envs = np.arange(self.n_envs)
+        resetting = np.zeros(self.n_envs, dtype=bool)
+        n = self.steps_count
+        while True:
+            actions = np.asarray(self.agent(obs))
+            next_obs, rewards, terminated, truncated, _ = self.env.step(actions)
+            dones = terminated | truncated
+
+            if self.next_step_reset and resetting.any():
+                live = np.flatnonzero(~resetting)
+            else:
+                live = envs
+            slots = self._counts[live] % n
+            self._states[live, slots] = obs[live]
+            self._actions[live, slots] = actions[live]
+            self._rewards[live, slots] = rewards[live]
+            self._counts[live] += 1
+            self._episode_rewards[live] += rewards[live]
+            self._episode_steps[live] += 1
+
+            # Envs whose window is full and still running: their oldest step goes out with n rewards
+            live_done = dones[live]
+            full = live[~live_done & (self._counts[live] >= n)]
+            if len(full):
+                oldest = self._counts[full] % n
+                order = (oldest[:, None] + self._window) % n
+                n_step_rewards = self._rewards[full[:, None], order] @ self._discounts
+                states = self._states[full, oldest]
+                first_actions = self._actions[full, oldest].tolist()
+                last_states = next_obs[full]
+                for i in range(len(full)):
+                    yield ExperienceFirstLast(states[i], first_actions[i], float(n_step_rewards[i]), last_states[i])
+
+            # Envs whose episode ended: everything left in the window goes out, without a last state
+            for env_idx in live[live_done].tolist():
+                count = min(self._counts[env_idx], n)
+                order = (self._counts[env_idx] - count + self._window[:count]) % n
+                states = self._states[env_idx, order]
+                first_actions = self._actions[env_idx, order].tolist()
+                window_rewards = self._rewards[env_idx, order]
+                returns = np.empty(count, dtype=np.float64)
+                running = 0.0
+                for j in range(count - 1, -1, -1):
+                    running = window_rewards[j] + self.gamma * running
+                    returns[j] = running
+                self.total_rewards.append(float(self._episode_rewards[env_idx]))
+                self.total_steps.append(int(self._episode_steps[env_idx]))
+                self._counts[env_idx] = 0
+                self._episode_rewards[env_idx] = 0.0
+                self._episode_steps[env_idx] = 0
+                for j in range(count):
+                    yield ExperienceFirstLast(states[j], first_actions[j], float(returns[j]), None)
+
+            resetting = dones
+            obs = next_obs
+
+    def pop_total_rewards(self) -> list:
+        """Total rewards of the episodes finished since the last call."""
+        rewards = self.total_rewards
+        if rewards:
+            self.total_rewards = []
+            self.total_steps = []
+        return rewards
+
+    def pop_rewards_steps(self) -> list:
+        """(total reward, steps) of the episodes finished since the last call."""
+        result = list(zip(self.total_rewards, self.total_steps))
+        if result:
+            self.total_rewards, self.total_steps = [], []
+        return result
@@ -0,0 +1,78 @@
+import gymnasium as gym
+import numpy as np
+import pytest
+from gymnasium.vector import AutoresetMode, SyncVectorEnv
+
+pytest.importorskip("torch")
+
+from lib.common import ExperienceSourceFirstLast  # noqa: E402
+
+GAMMA = 0.9
+N_ENVS = 4
+N_EXPERIENCES = 3000
+
+
+def make_vector_env(autoreset_mode):
+    return SyncVectorEnv([lambda: gym.make("CartPole-v1", max_episode_steps=30)] * N_ENVS,
+                         autoreset_mode=autoreset_mode)
+
+
+def random_agent(seed):
+    rng = np.random.default_rng(seed)
+    return lambda states: rng.integers(0, 2, len(states))
+
+
+def reference_experiences(env, agent, steps_count, n_experiences):
+    """n-step FirstLast experience computed the slow way: one list of steps per env."""
+    obs, _ = env.reset(seed=1)
+    histories = [[] for _ in range(N_ENVS)]
+    resetting = np.zeros(N_ENVS, dtype=bool)
+    next_step_reset = env.metadata["autoreset_mode"] == AutoresetMode.NEXT_STEP
+    experiences, total_rewards = [], []
+    while len(experiences) < n_experiences:
+        actions = agent(obs)
+        next_obs, rewards, terminated, truncated, _ = env.step(actions)
+        dones = terminated | truncated
+        live = [e for e in range(N_ENVS) if not (next_step_reset and resetting[e])]
+        for e in live:
+            histories[e].append((obs[e].copy(), int(actions[e]), float(rewards[e])))
+        for e in live:
+            if not dones[e] and len(histories[e]) >= steps_count:
+                window = histories[e][-steps_count:]
+                reward = sum(GAMMA ** k * r for k, (_, _, r) in enumerate(window))
+                experiences.append((window[0][0], window[0][1], reward, next_obs[e].copy()))
+        for e in live:
+            if dones[e]:
+                window = histories[e][-steps_count:]
+                for j, (state, action, _) in enumerate(window):
+                    reward = sum(GAMMA ** k * r for k, (_, _, r) in enumerate(window[j:]))
+                    experiences.append((state, action, reward, None))
+                total_rewards.append(sum(r for _, _, r in histories[e]))
+                histories[e] = []
+        resetting = dones
+        obs = next_obs
+    return experiences[:n_experiences], total_rewards
+
+
+@pytest.mark.parametrize("autoreset_mode", [AutoresetMode.NEXT_STEP, AutoresetMode.SAME_STEP])
+@pytest.mark.parametrize("steps_count", [1, 3, 10])
+def test_first_last_matches_per_env_reference(autoreset_mode, steps_count):
+    source = ExperienceSourceFirstLast(make_vector_env(autoreset_mode), random_agent(0), GAMMA,
+                                       steps_count=steps_count, seed=1)
+    iterator = iter(source)
+    experiences = [next(iterator) for _ in range(N_EXPERIENCES)]
+    expected, total_rewards = reference_experiences(make_vector_env(autoreset_mode), random_agent(0),
+                                                    steps_count, N_EXPERIENCES)
+
+    for experience, (state, action, reward, last_state) in zip(experiences, expected):
+        np.testing.assert_array_equal(experience.state, state)
+        assert experience.action == action
+        assert experience.reward == pytest.approx(reward)
+        if last_state is None:
+            assert experience.last_state is None
+        else:
+            np.testing.assert_array_equal(experience.last_state, last_state)
+
+    finished = source.pop_total_rewards()
+    assert finished == total_rewards[:len(finished)]
+    assert source.pop_total_rewards() == []
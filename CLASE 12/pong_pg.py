@@ -1,9 +1,6 @@
 #!/usr/bin/env python3
-import gym
-import ptan
 import numpy as np
 import argparse
-import collections
 from tensorboardX import SummaryWriter
 
 import torch
@@ -25,28 +22,6 @@ GRAD_L2_CLIP = 0.1
 ENV_COUNT = 32
 
 
-def make_env():
-    return ptan.common.wrappers.wrap_dqn(gym.make("PongNoFrameskip-v4"))
-
-
-class MeanBuffer:
-    def __init__(self, capacity):
-        self.capacity = capacity
-        self.deque = collections.deque(maxlen=capacity)
-        self.sum = 0.0
-
-    def add(self, val):
-        if len(self.deque) == self.capacity:
-            self.sum -= self.deque[0]
-        self.deque.append(val)
-        self.sum += val
-
-    def mean(self):
-        if not self.deque:
-            return 0.0
-        return self.sum / len(self.deque)
-
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--cuda", default=False, action="store_true", help="Enable cuda")
@@ -54,14 +29,14 @@ if __name__ == "__main__":
     args = parser.parse_args()
     device = torch.device("cuda" if args.cuda else "cpu")
 
-    envs = [make_env() for _ in range(ENV_COUNT)]
+    envs = common.make_vec_env("PongNoFrameskip-v4", n_envs=ENV_COUNT)
     writer = SummaryWriter(comment="-pong-pg-" + args.name)
 
-    net = common.AtariPGN(envs[0].observation_space.shape, envs[0].action_space.n).to(device)
+    net = common.AtariPGN(envs.single_observation_space.shape, envs.single_action_space.n).to(device)
     print(net)
 
-    agent = ptan.agent.PolicyAgent(net, apply_softmax=True, device=device)
-    exp_source = ptan.experience.ExperienceSourceFirstLast(envs, agent, gamma=GAMMA, steps_count=REWARD_STEPS)
+    agent = common.PolicyAgent(net, device=device)
+    exp_source = common.ExperienceSourceFirstLast(envs, agent, gamma=GAMMA, steps_count=REWARD_STEPS)
 
     optimizer = optim.Adam(net.parameters(), lr=LEARNING_RATE, eps=1e-3)
 
@@ -69,7 +44,7 @@ if __name__ == "__main__":
     step_idx = 0
     done_episodes = 0
     train_step_idx = 0
-    baseline_buf = MeanBuffer(BASELINE_STEPS)
+    baseline_buf = common.MeanBuffer(BASELINE_STEPS)
 
     batch_states, batch_actions, batch_scales = [], [], []
     m_baseline, m_batch_scales, m_loss_entropy, m_loss_policy, m_loss_total = [], [], [], [], []
@@ -80,21 +55,21 @@ if __name__ == "__main__":
         for step_idx, exp in enumerate(exp_source):
             baseline_buf.add(exp.reward)
             baseline = baseline_buf.mean()
-            batch_states.append(np.array(exp.state, copy=False))
+            batch_states.append(exp.state)
             batch_actions.append(int(exp.action))
             batch_scales.append(exp.reward - baseline)
 
             # handle new rewards
             new_rewards = exp_source.pop_total_rewards()
-            if new_rewards:
-                if tracker.reward(new_rewards[0], step_idx):
-                    break
+            if any([tracker.reward(reward, step_idx) for reward in new_rewards]):
+                break
 
             if len(batch_states) < BATCH_SIZE:
                 continue
 
             train_step_idx += 1
-            states_v = torch.FloatTensor(np.array(batch_states, copy=False)).to(device)
+            # uint8 frames; AtariPGN scales them to floats on the device
+            states_v = torch.from_numpy(np.stack(batch_states)).to(device)
             batch_actions_t = torch.LongTensor(batch_actions).to(device)
 
             scale_std = np.std(batch_scales)
@@ -142,4 +117,5 @@ if __name__ == "__main__":
             batch_actions.clear()
             batch_scales.clear()
 
+    envs.close()
     writer.close()
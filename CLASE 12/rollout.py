@@ -0,0 +1,177 @@
+import time
+from typing import NamedTuple
+
+import numpy as np
+import torch
+from torch.distributions import Categorical
+from stable_baselines3.common.env_util import make_atari_env
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecFrameStack
+
+
+def make_vec_atari_env(env_id: str, n_envs: int = 1, seed: int = 0, n_stack: int = 4,
+                       env_kwargs: dict = None):
+    """
+    make_atari_env + VecFrameStack with the envs in subprocesses when n_envs > 1.
+
+    Each SubprocVecEnv worker emulates its own game, so the envs step on
+    different cores. Episodes end where AtariWrapper ends them (a lost life
+    for games with lives); the step limit per episode is the collector's.
+    """
+    vec_env_cls = SubprocVecEnv if n_envs > 1 else DummyVecEnv
+    env = make_atari_env(env_id, n_envs=n_envs, seed=seed, env_kwargs=env_kwargs, vec_env_cls=vec_env_cls)
+    return VecFrameStack(env, n_stack=n_stack)
+
+
+def to_float(observations: torch.Tensor) -> torch.Tensor:
+    """(N, H, W, C) uint8 frames -> (N, C, H, W) floats in [0, 1]."""
+    return observations.permute(0, 3, 1, 2).float().div_(255.0)
+
+
+class Episode(NamedTuple):
+    """One finished episode of one env, observations as the vec env returns them (channels last)."""
+    env_index: int
+    observations: torch.Tensor  # (T, H, W, C) uint8
+    actions: torch.Tensor  # (T,) int64
+    rewards: np.ndarray  # (T,) float32
+
+    @property
+    def length(self) -> int:
+        return len(self.actions)
+
+    @property
+    def total_reward(self) -> float:
+        return float(self.rewards.sum())
+
+    def batches(self, preprocess, device, chunk_size: int = 512):
+        """(slice, preprocessed states on device) over the episode, chunk_size steps at a time."""
+        for start in range(0, self.length, chunk_size):
+            chunk = slice(start, start + chunk_size)
+            yield chunk, preprocess(self.observations[chunk].to(device, non_blocking=True))
+
+
+class RolloutCollector:
+    """
+    Steps every env of a vec env together with one batched forward pass per step.
+
+    The policy maps preprocessed states (N, C, H, W) to action probabilities,
+    like PongPolicy and Policy_atla. Per step, the observations of all the envs
+    go through the policy as one batch (without autograd), actions are sampled
+    from it and the vec env steps all the envs at once; with a SubprocVecEnv the
+    emulators run in parallel on separate cores while the main process runs the
+    network, so frames per second grow with the number of envs up to the core
+    count.
+
+    Observations, actions and rewards are written into preallocated
+    (n_envs, capacity, ...) buffers, whose capacity doubles when an episode
+    outgrows it. When an env's episode ends it is handed out as an Episode
+    (copied out of the buffers) and that env goes on with its next episode, so
+    no env waits for the others. Log-probabilities are recomputed from the stored
+    observations at update time (see reinforce_backward), which keeps rollouts
+    free of autograd graphs. With one update per episode and several envs, an
+    episode may have been started by the policy of a few updates earlier.
+
+    With max_steps, an episode that reaches max_steps steps is cut there and
+    handed out; its env is not reset, so the next episode goes on from the
+    same game (as env.reset() does after a lost life with AtariWrapper).
+    """
+
+    def __init__(self, env, policy, preprocess=to_float, device=None, capacity: int = 1024,
+                 max_steps: int = None):
+        self.env = env
+        self.policy = policy
+        self.preprocess = preprocess
+        self.max_steps = max_steps
+        self.device = device if device is not None else next(policy.parameters()).device
+        self.n_envs = env.num_envs
+
+        self._obs = env.reset()
+        pin = self.device.type == 'cuda'
+        self.observations = torch.empty((self.n_envs, capacity) + self._obs.shape[1:], dtype=torch.uint8,
+                                        pin_memory=pin)
+        self.actions = torch.empty((self.n_envs, capacity), dtype=torch.int64)
+        self.rewards = np.empty((self.n_envs, capacity), dtype=np.float32)
+        self.lengths = np.zeros(self.n_envs, dtype=np.int64)
+        self._envs = torch.arange(self.n_envs)
+
+        self.frames = 0  # Agent steps summed over the envs
+        self.episodes_done = 0
+        self._start = time.perf_counter()
+
+    @property
+    def capacity(self) -> int:
+        return self.actions.shape[1]
+
+    @property
+    def fps(self) -> float:
+        """Agent steps per second over all the envs since the collector was created."""
+        return self.frames / (time.perf_counter() - self._start)
+
+    def _grow(self):
+        capacity = 2 * self.capacity
+        observations = torch.empty((self.n_envs, capacity) + self.observations.shape[2:], dtype=torch.uint8,
+                                   pin_memory=self.observations.is_pinned())
+        observations[:, :self.capacity] = self.observations
+        actions = torch.empty((self.n_envs, capacity), dtype=torch.int64)
+        actions[:, :self.capacity] = self.actions
+        rewards = np.empty((self.n_envs, capacity), dtype=np.float32)
+        rewards[:, :self.capacity] = self.rewards
+        self.observations, self.actions, self.rewards = observations, actions, rewards
+
+    @torch.no_grad()
+    def step(self) -> list:
+        """Step all the envs once; returns the Episodes that ended on this step."""
+        if self.lengths.max() == self.capacity:
+            self._grow()
+        steps = torch.from_numpy(self.lengths)
+        obs = torch.from_numpy(self._obs)
+        self.observations[self._envs, steps] = obs
+
+        probs = self.policy(self.preprocess(obs.to(self.device, non_blocking=True)))
+        actions = Categorical(probs).sample().cpu()
+        self.actions[self._envs, steps] = actions
+
+        self._obs, rewards, dones, _ = self.env.step(actions.numpy())
+        self.rewards[np.arange(self.n_envs), self.lengths] = rewards
+        self.lengths += 1
+        self.frames += self.n_envs
+        if self.max_steps is not None:
+            dones = dones | (self.lengths >= self.max_steps)
+
+        finished = []
+        for i in np.flatnonzero(dones).tolist():
+            length = self.lengths[i]
+            finished.append(Episode(i, self.observations[i, :length].clone(),
+                                    self.actions[i, :length].clone(), self.rewards[i, :length].copy()))
+            self.lengths[i] = 0
+        self.episodes_done += len(finished)
+        return finished
+
+    def episodes(self):
+        """Endless stream of finished episodes, in the order they end."""
+        while True:
+            yield from self.step()
+
+    def close(self):
+        self.env.close()
+
+
+def reinforce_backward(policy, episode: Episode, weights: torch.Tensor, preprocess=to_float,
+                       device=None, chunk_size: int = 512) -> float:
+    """
+    Accumulate the gradient of -sum_t log pi(a_t | s_t) * weights[t] over an episode.
+
+    The log-probabilities are recomputed from the stored observations, chunk_size
+    steps per forward pass, and each chunk is backpropagated right away: the loss
+    is a sum over steps, so the gradient is the same as one backward over the
+    whole episode while only one chunk of activations is held at a time.
+    Returns the loss value; the caller zeroes the gradients and steps the optimizer.
+    """
+    device = device if device is not None else next(policy.parameters()).device
+    weights = weights.to(device)
+    total = 0.0
+    for chunk, states in episode.batches(preprocess, device, chunk_size):
+        log_probs = Categorical(policy(states)).log_prob(episode.actions[chunk].to(device))
+        loss = -(log_probs * weights[chunk]).sum()
+        loss.backward()
+        total += loss.item()
+    return total
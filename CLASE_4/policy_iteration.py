@@ -1,12 +1,30 @@
-from mdp import MDP
+import numpy as np
+from mdp import MDP, csr_matvec, sweep_checkpoints, sweep_dtype
+
+EVALUATIONS = ('iterative', 'exact', 'modified')
 
 
 class PolicyIteration:
 
-    def __init__(self, mdp: MDP, discount: float = 0.9, iterations: int = 100):
+    def __init__(self, mdp: MDP, discount: float = 0.9, iterations: int = 100,
+                 evaluation: str = 'iterative', k: int = 10, solver: str = 'auto'):
+        # evaluation:
+        #   'iterative' -> k synchronous sweeps over the MDP interface
+        #   'exact'     -> solve (I - gamma P_pi) V = R_pi on the compiled model
+        #   'modified'  -> k sweeps of V = R_pi + gamma P_pi V on the compiled model
+        # solver: 'dense', 'sparse' (scipy) or 'auto' for the exact evaluation
+        if evaluation not in EVALUATIONS:
+            raise ValueError(f"Unknown evaluation: {evaluation}")
+        if solver not in ('auto', 'dense', 'sparse'):
+            raise ValueError(f"Unknown solver: {solver}")
+
         self.mdp = mdp
         self.discount = discount
         self.iterations = iterations
+        self.evaluation = evaluation
+        self.k = k
+        self.solver = solver
+        self.n_iterations = 0
         self.values = {}
         self.policy = {}
 
@@ -18,15 +36,134 @@ class PolicyIteration:
             else:
                 self.policy[state] = None
 
+        self.compiled = self.mdp.compile() if evaluation != 'iterative' else None
+
     def run_policy_iteration(self):
+        if self.compiled is not None:
+            self._run_compiled()
+            return
+
         for i in range(self.iterations):
-            self.policy_evaluation()
+            self.policy_evaluation(self.k)
 
             policy_stable = self.policy_improvement()
+            self.n_iterations = i + 1
 
             if policy_stable:
                 break
 
+    def _run_compiled(self):
+        for _ in self._iterate_compiled():
+            pass
+
+    def _iterate_compiled(self):
+        """
+        Policy iteration on the compiled model; yields (iteration, values, policy)
+        for the initial policy (iteration 0) and after every improvement.
+        """
+        model = self.compiled
+        values = np.array([self.values[s] for s in model.states], dtype=np.float64)
+        policy = np.array([
+            -1 if model.terminal[i] or self.policy[s] is None else model.action_index[self.policy[s]]
+            for i, s in enumerate(model.states)
+        ])
+        acting = policy >= 0
+        yield 0, values, policy
+
+        for i in range(self.iterations):
+            indptr, indices, probs, rewards = model.policy_model(policy)
+            if self.evaluation == 'exact':
+                values = self._solve(indptr, indices, probs, rewards)
+            else:
+                for _ in range(self.k):
+                    values = rewards + self.discount * csr_matvec(indptr, indices, probs, values)
+
+            # Greedy improvement; keep the current action on ties so the loop cannot cycle
+            q = model.q_values(values, self.discount)
+            greedy = np.argmax(q, axis=1)
+            rows = np.arange(model.n_states)
+            current = q[rows, np.where(acting, policy, 0)]
+            improve = acting & (q[rows, greedy] > current + 1e-12)
+            policy = np.where(improve, greedy, policy)
+            self.n_iterations = i + 1
+
+            self.values = dict(zip(model.states, values.tolist()))
+            for j, state in enumerate(model.states):
+                self.policy[state] = model.actions[policy[j]] if acting[j] else None
+            yield self.n_iterations, values, policy
+
+            if not improve.any():
+                break
+
+    @staticmethod
+    def sweep(mdp, discounts, iterations_list, evaluation: str = 'exact', k: int = 10,
+              solver: str = 'auto'):
+        """
+        Policy iteration for several discounts and iteration budgets.
+
+        Each discount is solved once with max(iterations_list) iterations and the
+        truncated results are snapshots of that run (a run that stabilises early
+        repeats its final snapshot; 0 iterations is the initial policy). Returns a structured array (see sweep_dtype),
+        one record per (discount, iterations) pair in discount-major order.
+        """
+        if evaluation == 'iterative':
+            raise ValueError("sweep needs a compiled evaluation ('exact' or 'modified')")
+
+        model = mdp.compile()
+        checkpoints = sweep_checkpoints(iterations_list)
+        records = np.zeros(len(discounts) * len(iterations_list), dtype=sweep_dtype(model.n_states))
+
+        for g, discount in enumerate(discounts):
+            pi = PolicyIteration(model, discount=discount, iterations=max(iterations_list),
+                                 evaluation=evaluation, k=k, solver=solver)
+            snapshots = {}
+            for i, values, policy in pi._iterate_compiled():
+                if i in checkpoints:
+                    snapshots[i] = (values, policy)
+                last = (values, policy)
+
+            for j, n_iter in enumerate(iterations_list):
+                values, policy = snapshots.get(n_iter, last)
+                record = records[g * len(iterations_list) + j]
+                record['discount'] = discount
+                record['iterations'] = n_iter
+                record['values'] = values
+                record['policy'] = policy
+                record['residual'] = np.abs(model.bellman_backup(values, discount) - values).max()
+
+        return records
+
+    @classmethod
+    def from_record(cls, mdp, record):
+        """PolicyIteration holding the result of one sweep record."""
+        model = mdp.compile()
+        pi = cls(mdp, discount=float(record['discount']), iterations=int(record['iterations']),
+                 evaluation='exact')
+        pi.n_iterations = pi.iterations
+        pi.values = dict(zip(model.states, record['values'].tolist()))
+        for state, a in zip(model.states, record['policy'].tolist()):
+            pi.policy[state] = model.actions[a] if a >= 0 else None
+        return pi
+
+    def _solve(self, indptr, indices, probs, rewards):
+        """Exact evaluation: (I - gamma P_pi) V = R_pi."""
+        n = len(rewards)
+        solver = self.solver
+        if solver == 'auto':
+            solver = 'dense' if n <= 2000 else 'sparse'
+
+        if solver == 'dense':
+            system = np.eye(n)
+            rows = np.repeat(np.arange(n), np.diff(indptr))
+            np.add.at(system, (rows, indices), -self.discount * probs)
+            return np.linalg.solve(system, rewards)
+
+        from scipy.sparse import csr_matrix, identity
+        from scipy.sparse.linalg import spsolve
+        transitions = csr_matrix((probs, indices, indptr), shape=(n, n))
+        system = (identity(n, format='csr') - self.discount * transitions).tocsc()
+        return spsolve(system, rewards)
+
     def policy_evaluation(self, eval_iterations: int = 10):
 
         for _ in range(eval_iterations):
@@ -101,6 +238,11 @@ if __name__ == "__main__":
 
     # "GRIDWORLD" or "BRIDGE"
     ENVIRONMENT = "BRIDGE"
+    # "iterative", "exact" or "modified"
+    EVALUATION = "exact"
+    # SWEEP=True solves every discount once and snapshots the iteration budgets
+    # (needs EVALUATION "exact" or "modified")
+    SWEEP = False
 
     logger.add("policy_iteration.log", rotation="500 MB", level="DEBUG")
 
@@ -118,6 +260,9 @@ if __name__ == "__main__":
     mdp = MDP(env)
     arrows = {'up': '  UP  ', 'down': ' DOWN ', 'left': ' LEFT ', 'right': 'RIGHT ', None: ' EXIT '}
 
+    if SWEEP:
+        results = PolicyIteration.sweep(mdp, discount_values, iterations_list, evaluation=EVALUATION)
+
     for discount in discount_values:
         logger.info(f"\n{'='*60}")
         logger.info(f"ENVIRONMENT: {ENVIRONMENT}, DISCOUNT: {discount}")
@@ -126,8 +271,14 @@ if __name__ == "__main__":
         for n_iter in iterations_list:
             logger.info(f"=== Policy Iteration con {n_iter} iteraciones ===")
 
-            pi = PolicyIteration(mdp, discount=discount, iterations=n_iter)
-            pi.run_policy_iteration()
+            if SWEEP:
+                record = results[(results['discount'] == discount) & (results['iterations'] == n_iter)][0]
+                pi = PolicyIteration.from_record(mdp, record)
+                logger.info(f"residual={record['residual']:.2e}")
+            else:
+                pi = PolicyIteration(mdp, discount=discount, iterations=n_iter, evaluation=EVALUATION)
+                pi.run_policy_iteration()
+                logger.info(f"Evaluacion {EVALUATION}: {pi.n_iterations} iteraciones de mejora")
 
             logger.info(f"--- Valores (iteraciones={n_iter}, discount={discount}) ---")
             for r in range(env.nrows):
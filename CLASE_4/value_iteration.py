@@ -1,17 +1,109 @@
-from mdp import MDP
+import heapq
+import time
+import numpy as np
+from mdp import MDP, sweep_checkpoints, sweep_dtype
 from loguru import logger
 from gridworld_environment import GridWorld10x10
+
+SCHEDULES = ('synchronous', 'gauss_seidel', 'prioritized')
+
+
 class ValueIteration:
 
-    def __init__(self, mdp: MDP, discount: float = 0.9, iterations: int = 100):
+    def __init__(self, mdp: MDP, discount: float = 0.9, iterations: int = 100,
+                 vectorized: bool = False, epsilon: float = None,
+                 schedule: str = 'synchronous'):
+        if schedule not in SCHEDULES:
+            raise ValueError(f"Unknown schedule: {schedule}")
+
         self.mdp = mdp
         self.discount = discount
-        self.iterations = iterations
+        self.iterations = iterations  # upper bound on sweeps when epsilon is set
+        self.epsilon = epsilon        # stop once the Bellman residual drops below it
+        self.schedule = schedule
         self.values = {}
         for state in self.mdp.get_states():
             self.values[state] = 0.0
 
+        # Compiled model: every sweep becomes max_a (R + gamma * P V) over arrays.
+        # The in-place schedules also run on it.
+        if vectorized or schedule != 'synchronous':
+            self.compiled = self.mdp.compile()
+        else:
+            self.compiled = None
+        self._qvalues = None
+
+        # Run statistics
+        self.n_iterations = 0
+        self.n_backups = 0
+        self.residual = float('inf')
+        self.wall_time = 0.0
+
+    @staticmethod
+    def sweep(mdp, discounts, iterations_list):
+        """
+        Value iteration for several discounts in one run.
+
+        Value functions are stacked into a (n_discounts, n_states) array and
+        swept together; the truncated results for every entry of iterations_list
+        are snapshots of that single run. Returns a structured array (see
+        sweep_dtype) with one record per (discount, iterations) pair, in the
+        order discount-major. A 0 entry holds the initial (zero) values, with an
+        infinite residual like a planner that has not run.
+        """
+        model = mdp.compile()
+        discounts = np.asarray(discounts, dtype=np.float64)
+        checkpoints = sweep_checkpoints(iterations_list)
+        gamma = discounts[:, None]
+
+        records = np.zeros(len(discounts) * len(iterations_list), dtype=sweep_dtype(model.n_states))
+        records['discount'] = np.repeat(discounts, len(iterations_list))
+        records['iterations'] = np.tile(iterations_list, len(discounts))
+
+        def snapshot(i, values, residual):
+            for j in checkpoints.get(i, ()):
+                rows = np.arange(len(discounts)) * len(iterations_list) + j
+                records['values'][rows] = values
+                records['policy'][rows] = model.greedy_policy(values, gamma)
+                records['residual'][rows] = residual
+
+        values = np.zeros((len(discounts), model.n_states))
+        snapshot(0, values, np.inf)
+        for i in range(1, max(checkpoints, default=0) + 1):
+            new_values = model.bellman_backup(values, gamma)
+            residual = np.abs(new_values - values).max(axis=-1)
+            values = new_values
+            snapshot(i, values, residual)
+
+        return records
+
+    @classmethod
+    def from_record(cls, mdp, record):
+        """ValueIteration holding the result of one sweep record."""
+        vi = cls(mdp, discount=float(record['discount']),
+                 iterations=int(record['iterations']), vectorized=True)
+        vi._store_values(np.array(record['values']))
+        vi.n_iterations = vi.iterations
+        vi.residual = float(record['residual'])
+        return vi
+
     def run_value_iteration(self):
+        start = time.perf_counter()
+        if self.schedule == 'gauss_seidel':
+            self._run_gauss_seidel()
+        elif self.schedule == 'prioritized':
+            self._run_prioritized()
+        elif self.compiled is not None:
+            self._run_vectorized()
+        else:
+            self._run_synchronous()
+        self.wall_time = time.perf_counter() - start
+
+    def _converged(self) -> bool:
+        return self.epsilon is not None and self.residual < self.epsilon
+
+    def _run_synchronous(self):
+        n_non_terminal = sum(not self.mdp.is_terminal(s) for s in self.values)
         for i in range(self.iterations):
             new_values = {}
             for state in self.mdp.get_states():
@@ -22,7 +114,120 @@ class ValueIteration:
                     new_values[state] = max(
                         self.compute_qvalue_from_values(state, a) for a in actions
                     )
+            self.residual = max(abs(new_values[s] - self.values[s]) for s in new_values)
             self.values = new_values
+            self.n_iterations = i + 1
+            self.n_backups += n_non_terminal
+            if self._converged():
+                break
+
+    def _run_vectorized(self):
+        model = self.compiled
+        values = self._values_array()
+        n_non_terminal = int((~model.terminal).sum())
+        for i in range(self.iterations):
+            new_values = model.bellman_backup(values, self.discount)
+            self.residual = float(np.abs(new_values - values).max())
+            values = new_values
+            self.n_iterations = i + 1
+            self.n_backups += n_non_terminal
+            if self._converged():
+                break
+
+        self._store_values(values)
+
+    def _run_gauss_seidel(self):
+        # In-place sweeps: each backup already sees the values updated earlier in the sweep
+        model = self.compiled
+        values = self._values_array()
+        state_rows = self._state_rows()
+        for i in range(self.iterations):
+            residual = 0.0
+            for s, rows in state_rows:
+                new_value = self._backup_state(values, rows)
+                residual = max(residual, abs(new_value - values[s]))
+                values[s] = new_value
+            self.residual = residual
+            self.n_iterations = i + 1
+            self.n_backups += len(state_rows)
+            if self._converged():
+                break
+
+        self._store_values(values)
+
+    def _run_prioritized(self):
+        # Back up the state with the largest Bellman residual first; after each
+        # update only its predecessors need their residual re-evaluated.
+        model = self.compiled
+        values = self._values_array()
+        state_rows = dict(self._state_rows())
+        predecessors = self._predecessors()
+        threshold = self.epsilon if self.epsilon is not None else 0.0
+        budget = self.iterations * len(state_rows)
+
+        priority = np.zeros(model.n_states)
+        queue = []
+        for s, rows in state_rows.items():
+            priority[s] = abs(self._backup_state(values, rows) - values[s])
+            if priority[s] > threshold:
+                queue.append((-priority[s], s))
+        heapq.heapify(queue)
+
+        while queue and self.n_backups < budget:
+            neg_priority, s = heapq.heappop(queue)
+            if -neg_priority != priority[s]:
+                continue  # stale entry
+            values[s] = self._backup_state(values, state_rows[s])
+            priority[s] = 0.0
+            self.n_backups += 1
+
+            for p in predecessors[s]:
+                if p not in state_rows:
+                    continue
+                priority[p] = abs(self._backup_state(values, state_rows[p]) - values[p])
+                if priority[p] > threshold:
+                    heapq.heappush(queue, (-priority[p], p))
+
+        # Sweep-equivalents, so runs are comparable with the other schedules
+        self.n_iterations = -(-self.n_backups // max(len(state_rows), 1))
+        self.residual = float(np.abs(model.bellman_backup(values, self.discount) - values).max())
+        self._store_values(values)
+
+    def _values_array(self):
+        return np.array([self.values[s] for s in self.compiled.states], dtype=np.float64)
+
+    def _store_values(self, values):
+        model = self.compiled
+        self.values = dict(zip(model.states, values.tolist()))
+        self._qvalues = model.q_values(values, self.discount)
+
+    def _state_rows(self):
+        """(state index, CSR rows of its available actions) for every non-terminal state."""
+        model = self.compiled
+        return [
+            (s, (s * model.n_actions + np.flatnonzero(model.valid[s])).tolist())
+            for s in np.flatnonzero(~model.terminal).tolist()
+        ]
+
+    def _backup_state(self, values, rows) -> float:
+        model = self.compiled
+        best = float('-inf')
+        for row in rows:
+            lo, hi = model.indptr[row], model.indptr[row + 1]
+            q = model.rewards[row] + self.discount * float(
+                np.dot(model.probs[lo:hi], values[model.indices[lo:hi]])
+            )
+            best = max(best, q)
+        return best
+
+    def _predecessors(self):
+        """predecessors[s']: states with some action that can reach s' (itself included)."""
+        model = self.compiled
+        sources = np.repeat(np.arange(model.n_states * model.n_actions), np.diff(model.indptr))
+        sources //= model.n_actions
+        pairs = np.unique(np.stack([model.indices.astype(np.int64), sources], axis=1), axis=0)
+        bounds = np.searchsorted(pairs[:, 0], np.arange(model.n_states + 1))
+        return [pairs[bounds[s]:bounds[s + 1], 1].tolist() for s in range(model.n_states)]
 
     def get_value(self, state):
         return self.values.get(state, 0.0)
@@ -35,6 +240,13 @@ class ValueIteration:
         return q_value
 
     def compute_action_from_values(self, state):
+        if self._qvalues is not None:
+            model = self.compiled
+            i = model.state_index[state]
+            if not model.valid[i].any():
+                return None
+            return model.actions[int(np.argmax(self._qvalues[i]))]
+
         actions = self.mdp.get_possible_actions(state)
         if not actions:
             return None
@@ -65,6 +277,13 @@ if __name__ == "__main__":
 
     # "GRIDWORLD" or "BRIDGE"
     ENVIRONMENT = "BRIDGE"  
+    VECTORIZED = True
+    # "synchronous", "gauss_seidel" or "prioritized"; EPSILON=None runs every iteration
+    SCHEDULE = "synchronous"
+    EPSILON = None
+    # SWEEP=True plans every discount/iteration pair in one batched run
+    # (synchronous, fixed iteration counts: SCHEDULE and EPSILON are not used)
+    SWEEP = False
 
     logger.add("value_iteration.log", rotation="500 MB", level="DEBUG")
 
@@ -82,6 +301,12 @@ if __name__ == "__main__":
     mdp = MDP(env)
     arrows = {'up': '  UP  ', 'down': ' DOWN ', 'left': ' LEFT ', 'right': 'RIGHT ', None: ' EXIT '}
 
+    if SWEEP:
+        start = time.perf_counter()
+        results = ValueIteration.sweep(mdp, discount_values, iterations_list)
+        logger.info(f"Barrido de {len(results)} configuraciones en "
+                    f"{(time.perf_counter() - start) * 1000:.2f} ms")
+
     for discount in discount_values:
         logger.info(f"\n{'='*60}")
         logger.info(f"ENVIRONMENT: {ENVIRONMENT}, DISCOUNT: {discount}")
@@ -90,8 +315,16 @@ if __name__ == "__main__":
         for n_iter in iterations_list:
             logger.info(f"=== Value Iteration con {n_iter} iteraciones ===")
 
-            vi = ValueIteration(mdp, discount=discount, iterations=n_iter)
-            vi.run_value_iteration()
+            if SWEEP:
+                record = results[(results['discount'] == discount) & (results['iterations'] == n_iter)][0]
+                vi = ValueIteration.from_record(mdp, record)
+                logger.info(f"residual={vi.residual:.2e}")
+            else:
+                vi = ValueIteration(mdp, discount=discount, iterations=n_iter,
+                                    vectorized=VECTORIZED, epsilon=EPSILON, schedule=SCHEDULE)
+                vi.run_value_iteration()
+                logger.info(f"{SCHEDULE}: {vi.n_iterations} iteraciones, {vi.n_backups} backups, "
+                            f"residual={vi.residual:.2e}, tiempo={vi.wall_time * 1000:.2f} ms")
 
             logger.info(f"--- Valores (iteraciones={n_iter}, discount={discount}) ---")
             for r in range(env.nrows):
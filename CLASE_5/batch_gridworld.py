@@ -0,0 +1,134 @@
+import time
+import numpy as np
+from loguru import logger
+
+MOVEMENT_ACTIONS = ['up', 'down', 'left', 'right']
+STAY = len(MOVEMENT_ACTIONS)
+
+
+class BatchGridWorld:
+    """
+    N independent copies of a grid environment stepped in lockstep.
+
+    Agent positions are flat cell indices (r * ncols + c) held in one int array.
+    A step resolves the slip noise, walls and terminal states of every agent
+    with NumPy operations and resets the agents whose episode ended.
+
+    Built from any environment exposing `board`, `initial_state` and
+    `_calculate_new_state`, with either the clockwise slip model of
+    GridWorld10x10/BridgeEnvironment (action_success_prob, clockwise_prob, ...)
+    or a per-action `noise` dict as in the TD GridWorld.
+    """
+
+    def __init__(self, env, n_envs: int, max_steps: int = 1000, rng: np.random.Generator = None):
+        self.env = env
+        self.n_envs = n_envs
+        self.max_steps = max_steps
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.nrows = env.nrows
+        self.ncols = env.ncols
+        self.actions = MOVEMENT_ACTIONS
+
+        n_cells = self.nrows * self.ncols
+        cells = [(r, c) for r in range(self.nrows) for c in range(self.ncols)]
+
+        # moved[cell, d]: cell reached when direction d is executed, last column = stay
+        self.moved = np.empty((n_cells, STAY + 1), dtype=np.int32)
+        for i, (r, c) in enumerate(cells):
+            for d, action in enumerate(MOVEMENT_ACTIONS):
+                self.moved[i, d] = self._cell(*env._calculate_new_state(r, c, action))
+            self.moved[i, STAY] = i
+
+        self.terminal = np.array(
+            [isinstance(env.board[r][c], (int, float)) for r, c in cells], dtype=bool)
+        self.rewards = np.array(
+            [float(env.board[r][c]) if t else 0.0 for (r, c), t in zip(cells, self.terminal)])
+
+        # Cumulative distribution of the executed direction for every intended action
+        self.cum_probs = np.cumsum(self._executed_probs(env), axis=1)
+        self.initial_cell = self._cell(*env.initial_state)
+
+        self.cells = np.full(n_envs, self.initial_cell, dtype=np.int32)
+        self.episode_steps = np.zeros(n_envs, dtype=np.int64)
+        self.episode_returns = np.zeros(n_envs)
+        # Return and length of the episodes that ended on the last step
+        self.finished_returns = np.zeros(0)
+        self.finished_steps = np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _executed_probs(env):
+        """(4, 5) matrix: P(executed direction or stay | intended action)."""
+        probs = np.zeros((len(MOVEMENT_ACTIONS), STAY + 1))
+        for a, action in enumerate(MOVEMENT_ACTIONS):
+            if hasattr(env, 'action_success_prob'):
+                probs[a, a] += env.action_success_prob
+                probs[a, MOVEMENT_ACTIONS.index(env._get_clockwise_action(action))] += env.clockwise_prob
+                probs[a, MOVEMENT_ACTIONS.index(env._get_counterclockwise_action(action))] += env.counterclockwise_prob
+                probs[a, STAY] += env.stay_prob
+            else:
+                noise = env.noise[action]
+                probs[a, :STAY] = noise / (len(MOVEMENT_ACTIONS) - 1)
+                probs[a, a] = 1 - noise
+        return probs
+
+    def _cell(self, r, c):
+        return r * self.ncols + c
+
+    def reset(self):
+        self.cells[:] = self.initial_cell
+        self.episode_steps[:] = 0
+        self.episode_returns[:] = 0.0
+        return self.cells.copy()
+
+    def get_current_states(self):
+        """Positions as a list of (r, c) tuples, for code written against the scalar env."""
+        rows, cols = np.divmod(self.cells, self.ncols)
+        return list(zip(rows.tolist(), cols.tolist()))
+
+    def step(self, actions: np.ndarray):
+        """
+        Apply one action index per agent.
+
+        Returns (rewards, next_cells, dones). next_cells are the cells the agents
+        moved to; agents with done=True (terminal reached or max_steps hit) are
+        already back at the initial state for the next call.
+        """
+        u = self.rng.random(self.n_envs)
+        executed = (u[:, None] >= self.cum_probs[actions]).sum(axis=1)
+        np.minimum(executed, STAY, out=executed)  # guards against rounding in the cumsum
+
+        next_cells = self.moved[self.cells, executed]
+        rewards = self.rewards[next_cells]
+
+        self.episode_steps += 1
+        self.episode_returns += rewards
+        dones = self.terminal[next_cells] | (self.episode_steps >= self.max_steps)
+
+        self.cells = np.where(dones, self.initial_cell, next_cells).astype(np.int32)
+        self.finished_returns = self.episode_returns[dones]
+        self.finished_steps = self.episode_steps[dones]
+        self.episode_returns[dones] = 0.0
+        self.episode_steps[dones] = 0
+
+        return rewards, next_cells, dones
+
+
+if __name__ == '__main__':
+    from gridworld_environment import GridWorld10x10
+
+    N_ENVS = 100_000
+    N_STEPS = 200
+
+    batch = BatchGridWorld(GridWorld10x10(), n_envs=N_ENVS, rng=np.random.default_rng(42))
+    batch.reset()
+
+    start = time.perf_counter()
+    n_episodes = 0
+    for _ in range(N_STEPS):
+        actions = batch.rng.integers(len(batch.actions), size=N_ENVS)
+        _, _, dones = batch.step(actions)
+        n_episodes += int(dones.sum())
+    elapsed = time.perf_counter() - start
+
+    logger.info(f"{N_ENVS * N_STEPS / elapsed:,.0f} transiciones/s, "
+                f"{n_episodes} episodios completados")
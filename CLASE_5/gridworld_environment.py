@@ -1,80 +1,47 @@
 import numpy as np
 from typing import Tuple, List
+from random_stream import as_stream
+from grid_tables import TabularGrid, CLOCKWISE, COUNTERCLOCKWISE
 
 
-class Environment:
-    def __init__(self, board, P, initial_state):
+class Environment(TabularGrid):
+    def __init__(self, board, P, initial_state, rng: np.random.Generator = None):
+        self.rng = as_stream(rng)
         self.board = board
         self.nrows = len(board)
         self.ncols = len(board[0])
         self.initial_state = initial_state
         self.current_state = initial_state
         self.P = P
+        self._build_tables()
 
     def get_current_state(self):
         return self.current_state
 
-    def get_possible_actions(self, state):
-        r, c = state
-        if isinstance(self.board[r][c], (int, float)):
-            return ['exit']
-        return ['up', 'down', 'left', 'right']
-
     def do_action(self, action):
         r, c = self.current_state
+        cell = r * self.ncols + c
 
-        if self.is_terminal():
+        if self._terminal[cell]:
             if action == 'exit':
-                reward = self.board[r][c]
-                return reward, self.current_state
+                return self._rewards[cell], self.current_state
             return 0, self.current_state
 
         if self.P[r][c] == '#':
             return 0, self.current_state
 
-        probs = self.P[r][c]
-        actual_action_idx = np.random.choice(4, p=probs)
-        actual_actions = ['up', 'down', 'left', 'right']
-        actual_action = actual_actions[actual_action_idx]
-
-        new_state = self._calculate_new_state(r, c, actual_action)
-
-        reward = 0
-        if isinstance(self.board[new_state[0]][new_state[1]], (int, float)):
-            reward = self.board[new_state[0]][new_state[1]]
-
-        self.current_state = new_state
-        return reward, new_state
-
-    def _calculate_new_state(self, r, c, action):
-        if action == 'up':
-            new_r, new_c = r - 1, c
-        elif action == 'down':
-            new_r, new_c = r + 1, c
-        elif action == 'left':
-            new_r, new_c = r, c - 1
-        elif action == 'right':
-            new_r, new_c = r, c + 1
-        else:
-            return (r, c)
-
-        if (new_r < 0 or new_r >= self.nrows or
-            new_c < 0 or new_c >= self.ncols or
-            self.board[new_r][new_c] == '#'):
-            return (r, c)
+        new_cell = self._next_cells[cell][self.rng.categorical(self.P[r][c])]
 
-        return (new_r, new_c)
+        self.current_state = self.cell_states[new_cell]
+        return self._rewards[new_cell], self.current_state
 
     def reset(self):
         self.current_state = self.initial_state
 
-    def is_terminal(self):
-        r, c = self.current_state
-        return isinstance(self.board[r][c], (int, float))
-
 
-class GridWorld10x10:
-    def __init__(self):
+class GridWorld10x10(TabularGrid):
+    def __init__(self, rng: np.random.Generator = None):
+        self.rng = as_stream(rng)
         self.nrows = 10
         self.ncols = 10
         self.initial_state = (0, 0)
@@ -82,6 +49,7 @@ class GridWorld10x10:
 
         self._initialize_board()
         self._initialize_obstacles()
+        self._build_tables()
 
         noise = 0.25
         self.action_success_prob = 1 - noise  # 0.75
@@ -120,65 +88,31 @@ class GridWorld10x10:
         counterclockwise_map = {'up': 'left', 'left': 'down', 'down': 'right', 'right': 'up'}
         return counterclockwise_map[action]
 
-    def _calculate_new_state(self, r, c, action):
-        if action not in self.action_map:
-            return (r, c)
-        dr, dc = self.action_map[action]
-        new_r, new_c = r + dr, c + dc
-
-        if (new_r < 0 or new_r >= self.nrows or
-            new_c < 0 or new_c >= self.ncols or
-            self.board[new_r][new_c] == '#'):
-            return (r, c)
-
-        return (new_r, new_c)
-
     def get_current_state(self):
         return self.current_state
 
-    def get_possible_actions(self, state):
-        r, c = state
-        if isinstance(self.board[r][c], (int, float)):
-            return ['exit']
-        return ['up', 'down', 'left', 'right']
-
     def do_action(self, action):
         r, c = self.current_state
+        cell = r * self.ncols + c
 
-        if self.is_terminal():
+        if self._terminal[cell]:
             if action == 'exit':
-                reward = self.board[r][c]
-                return reward, self.current_state
+                return self._rewards[cell], self.current_state
             return 0, self.current_state
 
-        clockwise = self._get_clockwise_action(action)
-        counterclockwise = self._get_counterclockwise_action(action)
-
-        rand = np.random.random()
+        a = self.action_index[action]
+        rand = self.rng.random()
         if rand < self.action_success_prob:
-            executed = action
+            new_cell = self._next_cells[cell][a]
         elif rand < self.action_success_prob + self.clockwise_prob:
-            executed = clockwise
+            new_cell = self._next_cells[cell][CLOCKWISE[a]]
         elif rand < self.action_success_prob + self.clockwise_prob + self.counterclockwise_prob:
-            executed = counterclockwise
-        else:
-            executed = None  # stay
-
-        if executed is None:
-            new_state = (r, c)
+            new_cell = self._next_cells[cell][COUNTERCLOCKWISE[a]]
         else:
-            new_state = self._calculate_new_state(r, c, executed)
+            new_cell = cell  # stay
 
-        reward = 0
-        if isinstance(self.board[new_state[0]][new_state[1]], (int, float)):
-            reward = self.board[new_state[0]][new_state[1]]
-
-        self.current_state = new_state
-        return reward, new_state
+        self.current_state = self.cell_states[new_cell]
+        return self._rewards[new_cell], self.current_state
 
     def reset(self):
         self.current_state = self.initial_state
-
-    def is_terminal(self):
-        r, c = self.current_state
-        return isinstance(self.board[r][c], (int, float))
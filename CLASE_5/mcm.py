@@ -1,14 +1,64 @@
 import numpy as np
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from loguru import logger
+from random_stream import RandomStream, as_stream
+from profiling import Profiler, profile_session
+
+ACTIONS = ['up', 'down', 'left', 'right', 'exit']
+
+
+def _encode_episode(episode, ncols):
+    """Episode as compact arrays: flat state index, action index and reward per step."""
+    states = np.array([r * ncols + c for (r, c), _, _ in episode], dtype=np.int32)
+    actions = np.array([ACTIONS.index(a) for _, a, _ in episode], dtype=np.int8)
+    rewards = np.array([reward for _, _, reward in episode], dtype=np.float64)
+    return states, actions, rewards
+
+
+def discounted_returns(rewards: np.ndarray, lengths: np.ndarray, discount: float) -> np.ndarray:
+    """
+    G_t = r_t + discount * G_{t+1} for a batch of episodes concatenated in one array.
+
+    One reverse pass over time steps, vectorized across episodes: at step k from
+    the end, every episode longer than k is updated at once, so the Python loop
+    runs max(lengths) times rather than once per transition.
+    """
+    returns = np.array(rewards, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    ends = np.cumsum(lengths)
+
+    # Longest episodes first, so the ones still running at step k are a prefix
+    order = np.argsort(-lengths, kind='stable')
+    ends, lengths = ends[order], lengths[order]
+    max_length = lengths[0] if len(lengths) else 0
+    n_running = np.searchsorted(-lengths, -np.arange(1, max_length), side='left')
+    for k, n in enumerate(n_running, start=1):
+        t = ends[:n] - 1 - k
+        returns[t] += discount * returns[t + 1]
+    return returns
+
+
+def _generate_episodes(env, q_values, discount, epsilon, seed, n_episodes, max_steps):
+    """Worker task: n_episodes following a snapshot of Q, seeded independently."""
+    env_seed, agent_seed = np.random.SeedSequence(seed).spawn(2)
+    env.rng = RandomStream(np.random.default_rng(env_seed))
+    agent = MCM(env, discount=discount, epsilon=epsilon, rng=np.random.default_rng(agent_seed))
+    agent.q_values.update(q_values)
+    return [
+        _encode_episode(agent.generate_episode(max_steps), env.ncols)
+        for _ in range(n_episodes)
+    ]
 
 
 class MCM:
 
-    def __init__(self, env, discount: float = 0.9, epsilon: float = 0.3):
+    def __init__(self, env, discount: float = 0.9, epsilon: float = 0.3,
+                 rng: np.random.Generator = None):
         self.env = env
         self.discount = discount
         self.epsilon = epsilon
+        self.rng = as_stream(rng)
 
         self.q_values = defaultdict(float)
         self.visit_counts = defaultdict(int)
@@ -17,6 +67,11 @@ class MCM:
         self.convergence_history = []
         self.n_episodes = 0
 
+        # States whose Q-values changed since the policy/value caches were refreshed,
+        # and the largest value change seen by those refreshes since the last check
+        self._dirty = set()
+        self._max_change = 0.0
+
         self._non_terminal_states = set()
         for r in range(env.nrows):
             for c in range(env.ncols):
@@ -46,8 +101,8 @@ class MCM:
         if not actions:
             return None
 
-        if np.random.random() < self.epsilon:
-            return np.random.choice(actions)
+        if self.rng.random() < self.epsilon:
+            return self.rng.choice(actions)
 
         best_action = None
         best_q = float('-inf')
@@ -57,87 +112,166 @@ class MCM:
                 best_q = q
                 best_action = a
 
-        return best_action if best_action is not None else np.random.choice(actions)
+        return best_action if best_action is not None else self.rng.choice(actions)
 
     def update_from_episode(self, episode: list):
-        G = 0.0
-        visited = set()
-
-        for i in range(len(episode) - 1, -1, -1):
-            state, action, reward = episode[i]
-            G = reward + self.discount * G
-
-            sa = (state, action)
-            if sa not in visited:
-                visited.add(sa)
-                n = self.visit_counts[sa]
-                self.q_values[sa] += (G - self.q_values[sa]) / (n + 1)
-                self.visit_counts[sa] = n + 1
-
-    def update_policy(self):
-        states = set()
-        for (state, action) in self.q_values:
-            states.add(state)
-
-        for state in states:
+        self.update_from_episodes([_encode_episode(episode, self.env.ncols)])
+
+    def update_from_episodes(self, encoded_episodes: list):
+        """
+        First-visit Monte Carlo update from a batch of episodes encoded as
+        (state index, action index, reward) arrays.
+
+        The returns of every step come from one reverse discounting pass, the
+        first visit of each (state, action) per episode from np.unique over
+        (episode, pair) keys, and the returns are summed per pair with np.add.at,
+        so Q(s, a) moves to the incremental mean over all new visits at once.
+        """
+        if not encoded_episodes:
+            return
+        states, actions, rewards = (np.concatenate(column) for column in zip(*encoded_episodes))
+        lengths = np.array([len(e[0]) for e in encoded_episodes], dtype=np.int64)
+        returns = discounted_returns(rewards, lengths, self.discount)
+
+        n_pairs = self.env.nrows * self.env.ncols * len(ACTIONS)
+        pairs = states.astype(np.int64) * len(ACTIONS) + actions
+        episode_ids = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+        _, first = np.unique(episode_ids * n_pairs + pairs, return_index=True)
+
+        return_sums = np.zeros(n_pairs)
+        visit_counts = np.zeros(n_pairs, dtype=np.int64)
+        np.add.at(return_sums, pairs[first], returns[first])
+        np.add.at(visit_counts, pairs[first], 1)
+
+        # Only the (state, action) pairs seen in the batch touch the dict Q-table
+        for pair in np.flatnonzero(visit_counts).tolist():
+            cell, a = divmod(pair, len(ACTIONS))
+            state = divmod(cell, self.env.ncols)
+            sa = (state, ACTIONS[a])
+            n, m = self.visit_counts[sa], int(visit_counts[pair])
+            self.q_values[sa] += (return_sums[pair] - m * self.q_values[sa]) / (n + m)
+            self.visit_counts[sa] = n + m
+            self._dirty.add(state)
+
+    def _refresh_dirty_states(self):
+        """Recompute the greedy action and max-Q of the states touched since the last refresh."""
+        for state in self._dirty:
             actions = self.env.get_possible_actions(state)
-            if not actions or actions == ['exit']:
-                continue
-
-            best_action = None
-            best_q = float('-inf')
-            for a in actions:
-                q = self.q_values.get((state, a), 0.0)
-                if q > best_q:
-                    best_q = q
-                    best_action = a
+            if actions == ['exit']:
+                value = 0.0
+            else:
+                best_action = None
+                max_q = float('-inf')
+                for a in actions:
+                    q = self.q_values.get((state, a), 0.0)
+                    if q > max_q:
+                        max_q = q
+                        best_action = a
+                value = max_q if max_q != float('-inf') else 0.0
+                if best_action is not None:
+                    self.policy[state] = best_action
+
+            self._max_change = max(self._max_change, abs(value - self.values.get(state, 0.0)))
+            self.values[state] = value
+        self._dirty.clear()
 
-            self.policy[state] = best_action
+    def update_policy(self):
+        self._refresh_dirty_states()
 
     def update_values(self):
-        states = set()
-        for (state, action) in self.q_values:
-            states.add(state)
-
-        for state in states:
-            actions = self.env.get_possible_actions(state)
-            if actions == ['exit']:
-                self.values[state] = 0.0
-                continue
-
-            max_q = float('-inf')
-            for a in actions:
-                q = self.q_values.get((state, a), 0.0)
-                if q > max_q:
-                    max_q = q
-            self.values[state] = max_q if max_q != float('-inf') else 0.0
+        self._refresh_dirty_states()
+
+    def pop_max_change(self) -> float:
+        """Largest |V| change applied since the previous call."""
+        max_change, self._max_change = self._max_change, 0.0
+        return max_change
+
+    def _episode_stream(self, batch_size: int, n_workers: int, seed, episodes_per_task: int):
+        """
+        Endless stream of encoded episodes (see _encode_episode).
+
+        With n_workers > 1 every batch of batch_size episodes is generated in a
+        process pool from a snapshot of Q taken when the previous batch has been
+        merged. Each task gets its own seed derived from (seed, batch, task), and
+        episodes come back in submission order, so a run is reproducible for a
+        given seed no matter how many workers execute it.
+        """
+        if n_workers <= 1:
+            if seed is not None:
+                env_seed, agent_seed = np.random.SeedSequence(seed).spawn(2)
+                self.env.rng = RandomStream(np.random.default_rng(env_seed))
+                self.rng = RandomStream(np.random.default_rng(agent_seed))
+            while True:
+                yield _encode_episode(self.generate_episode(), self.env.ncols)
+
+        root = np.random.SeedSequence(seed)
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            batch = 0
+            while True:
+                q_snapshot = dict(self.q_values)
+                futures = []
+                for task, start in enumerate(range(0, batch_size, episodes_per_task)):
+                    task_seed = np.random.SeedSequence(root.entropy, spawn_key=(batch, task))
+                    futures.append(pool.submit(
+                        _generate_episodes, self.env, q_snapshot, self.discount, self.epsilon,
+                        task_seed.generate_state(4), min(episodes_per_task, batch_size - start), 1000,
+                    ))
+                for future in futures:
+                    yield from future.result()
+                batch += 1
 
     def run(self, convergence_threshold: float = 0.005, check_interval: int = 100,
-            patience: int = 3000, max_episodes: int = 500000) -> int:
+            patience: int = 3000, max_episodes: int = 500000, n_workers: int = 1,
+            seed: int = None, episodes_per_task: int = 25, profiler: Profiler = None) -> int:
+        """
+        Generate and merge episodes until the policy is stable (or max_episodes).
+        Returns the number of episodes.
+
+        With a Profiler, time is split into env.step, choose_action, update
+        (merging returns, refreshing policy and values) and bookkeeping
+        (episode recording, convergence checks; see profiling.py). With
+        n_workers > 1 the episodes are generated in worker processes, so env
+        steps and action choices are not timed (the env is left unwrapped, as
+        it is pickled for the workers).
+        """
+        hooks = [(self, 'update_from_episodes', 'update'), (self, 'update_policy', 'update'),
+                 (self, 'update_values', 'update')]
+        if n_workers <= 1:
+            hooks += [(self.env, 'do_action', 'env.step'), (self, '_select_action', 'choose_action')]
+        with profile_session(profiler, 'MCM', hooks):
+            return self._run(convergence_threshold, check_interval, patience, max_episodes,
+                             n_workers, seed, episodes_per_task, profiler)
+
+    def _run(self, convergence_threshold, check_interval, patience, max_episodes,
+             n_workers, seed, episodes_per_task, profiler):
         stable_count = 0
         checks_needed = patience // check_interval
-        prev_values = {}
         min_coverage = 0.7
 
+        # Parallel batches line up with the convergence checks. Their episodes all
+        # follow the same Q snapshot, so they are merged in one batched update;
+        # serial episodes are merged one by one to stay on-policy.
+        episodes = self._episode_stream(check_interval, n_workers, seed, episodes_per_task)
+        update_every = check_interval if n_workers > 1 else 1
+        pending = []
+
         for episode_num in range(1, max_episodes + 1):
-            episode = self.generate_episode()
-            self.update_from_episode(episode)
+            pending.append(next(episodes))
+            if profiler is not None:
+                profiler.episode(len(pending[-1][0]))
+            if episode_num % update_every == 0:
+                self.update_from_episodes(pending)
+                pending = []
             self.n_episodes = episode_num
 
             if episode_num % check_interval == 0:
                 self.update_policy()
                 self.update_values()
 
-                visited_states = set(self.policy.keys())
-                coverage = len(visited_states) / len(self._non_terminal_states)
-
-                max_change = 0.0
-                for state, value in self.values.items():
-                    old_value = prev_values.get(state, 0.0)
-                    max_change = max(max_change, abs(value - old_value))
+                coverage = len(self.policy) / len(self._non_terminal_states)
+                max_change = self.pop_max_change()
 
                 self.convergence_history.append((episode_num, max_change, coverage))
-                prev_values = dict(self.values)
 
                 if coverage >= min_coverage and max_change < convergence_threshold:
                     stable_count += 1
@@ -154,6 +288,8 @@ class MCM:
                                 f"(cobertura: {coverage:.1%})")
                     break
 
+        episodes.close()
+        self.update_from_episodes(pending)
         self.update_policy()
         self.update_values()
         return self.n_episodes
@@ -201,12 +337,17 @@ class MCM:
 if __name__ == "__main__":
     from gridworld_environment import GridWorld10x10
 
+    # N_WORKERS > 1 generates the episodes of each check interval in a process pool
+    # (batched updates from a per-batch Q snapshot, so it does not reproduce the serial run)
+    N_WORKERS = 1
+    SEED = 42
+
     logger.add("mcm.log", rotation="500 MB", level="DEBUG")
 
     env = GridWorld10x10()
     mcm = MCM(env, discount=0.9, epsilon=0.3)
 
-    n_episodes = mcm.run()
+    n_episodes = mcm.run(n_workers=N_WORKERS, seed=SEED)
     logger.success(f"MCM finalizado en {n_episodes} episodios")
 
     mcm.print_values()
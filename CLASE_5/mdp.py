@@ -1,58 +1,262 @@
-
+import numpy as np
 from gridworld_environment import Environment
+from grid_tables import CLOCKWISE, COUNTERCLOCKWISE
+
+MOVEMENT_ACTIONS = ['up', 'down', 'left', 'right']
+
+
+def csr_matvec(indptr, indices, probs, values):
+    """Row sums of probs * values[indices] for a CSR matrix. `values` may carry leading batch axes."""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.zeros(values.shape[:-1] + (len(indptr) - 1,))
+    nonempty = np.flatnonzero(np.diff(indptr))
+    if nonempty.size:
+        weighted = probs * values[..., indices]
+        out[..., nonempty] = np.add.reduceat(weighted, indptr[:-1][nonempty], axis=-1)
+    return out
+
+
+def sweep_dtype(n_states):
+    """Record layout of the planning sweeps: one row per (discount, iterations) cell."""
+    return np.dtype([
+        ('discount', np.float64),
+        ('iterations', np.int64),
+        ('residual', np.float64),
+        ('values', np.float64, (n_states,)),
+        ('policy', np.int64, (n_states,)),  # action index, -1 for terminal states
+    ])
+
+
+class CompiledMDP:
+    """
+    Array form of an MDP.
+
+    Rows are (state, action) pairs flattened as s * n_actions + a. Transitions
+    are stored in CSR layout (indptr/indices/probs), so memory grows with the
+    number of nonzero transitions. `rewards` holds the expected immediate
+    reward of every row and `state_rewards` the reward for entering each state.
+
+    It also answers the MDP interface (get_states, get_transition_states_and_probs,
+    ...), so any planner written against MDP can consume it directly.
+    """
+
+    def __init__(self, states, actions, indptr, indices, probs, state_rewards, valid, terminal):
+        self.states = states
+        self.actions = actions
+        self.state_index = {s: i for i, s in enumerate(states)}
+        self.action_index = {a: i for i, a in enumerate(actions)}
+
+        self.indptr = indptr
+        self.indices = indices
+        self.probs = probs
+        self.state_rewards = state_rewards
+        self.valid = valid        # (n_states, n_actions) available actions
+        self.terminal = terminal  # (n_states,)
+
+        self.rewards = self.expected_values(state_rewards)
+
+    @classmethod
+    def from_env(cls, env):
+        """
+        Build the model straight from a grid environment.
+
+        Needs the tables of a TabularGrid (walls, terminal, rewards, next_state)
+        and either the slip probabilities (action_success_prob, clockwise_prob,
+        counterclockwise_prob, stay_prob) or a per-cell `P` over the executed
+        action, as in Environment.
+        """
+        cells = np.flatnonzero(~env.walls)
+        states = [env.cell_states[cell] for cell in cells.tolist()]
+        n_states = len(states)
+        index_dtype = np.int32 if n_states < np.iinfo(np.int32).max else np.int64
+
+        terminal = env.terminal[cells]
+        state_rewards = env.rewards[cells]
+
+        # moved[s, d]: state reached when direction d is actually executed from s
+        cell_to_state = np.full(len(env.walls), -1, dtype=index_dtype)
+        cell_to_state[cells] = np.arange(n_states)
+        moved = cell_to_state[env.next_state[cells]]
+        stay = np.arange(n_states, dtype=index_dtype)
+
+        # Outcomes per (state, intended action): targets/weights of shape (S, 4, K)
+        if hasattr(env, 'action_success_prob'):
+            targets = np.stack([moved, moved[:, CLOCKWISE], moved[:, COUNTERCLOCKWISE],
+                                np.repeat(stay[:, None], 4, axis=1)], axis=-1)
+            weights = np.broadcast_to(
+                np.array([env.action_success_prob, env.clockwise_prob,
+                          env.counterclockwise_prob, env.stay_prob]),
+                targets.shape,
+            )
+        else:
+            # Environment: the executed action is drawn from P[r][c] regardless of the choice
+            cell_probs = np.zeros((n_states, len(MOVEMENT_ACTIONS) + 1))
+            for i, (r, c) in enumerate(states):
+                if env.P[r][c] == '#':
+                    cell_probs[i, -1] = 1.0
+                else:
+                    cell_probs[i, :-1] = env.P[r][c]
+            outcome_targets = np.concatenate([moved, stay[:, None]], axis=1)
+            targets = np.repeat(outcome_targets[:, None, :], len(MOVEMENT_ACTIONS), axis=1)
+            weights = np.repeat(cell_probs[:, None, :], len(MOVEMENT_ACTIONS), axis=1)
+
+        # Merge outcomes that land on the same state
+        n_outcomes = targets.shape[-1]
+        order = np.argsort(targets, axis=-1, kind='stable')
+        targets = np.take_along_axis(targets, order, axis=-1).reshape(-1, n_outcomes)
+        weights = np.take_along_axis(weights, order, axis=-1).reshape(-1, n_outcomes)
+        first = np.ones(targets.shape, dtype=bool)
+        first[:, 1:] = targets[:, 1:] != targets[:, :-1]
+        starts = np.flatnonzero(first.ravel())
+        move_probs = np.add.reduceat(weights.ravel(), starts)
+        move_targets = targets.ravel()[starts]
+        move_pairs = starts // n_outcomes  # s * 4 + d
+
+        actions = MOVEMENT_ACTIONS + ['exit']
+        n_actions = len(actions)
+        move_rows = (move_pairs // 4) * n_actions + move_pairs % 4
+        keep = (move_probs > 0) & ~terminal[move_pairs // 4]
+
+        # Terminal states only allow 'exit', which stays in place
+        exit_states = np.flatnonzero(terminal)
+        rows = np.concatenate([move_rows[keep], exit_states * n_actions + n_actions - 1])
+        indices = np.concatenate([move_targets[keep], exit_states]).astype(index_dtype)
+        probs = np.concatenate([move_probs[keep], np.ones(len(exit_states))])
+
+        order = np.argsort(rows, kind='stable')
+        rows, indices, probs = rows[order], indices[order], probs[order]
+        indptr = np.zeros(n_states * n_actions + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_states * n_actions), out=indptr[1:])
+
+        valid = np.zeros((n_states, n_actions), dtype=bool)
+        valid[~terminal, :-1] = True
+        valid[terminal, -1] = True
+
+        return cls(states, actions, indptr, indices, probs, state_rewards, valid, terminal)
+
+    @property
+    def n_states(self):
+        return len(self.states)
+
+    @property
+    def n_actions(self):
+        return len(self.actions)
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.probs.nbytes + self.rewards.nbytes
+
+    def expected_values(self, values):
+        """sum_s' P(s' | s, a) * V(s') for every row. `values` may carry leading batch axes."""
+        return csr_matvec(self.indptr, self.indices, self.probs, values)
+
+    def q_values(self, values, discount):
+        """Q(s, a) for every pair, -inf where the action is not available."""
+        values = np.asarray(values, dtype=np.float64)
+        q = self.rewards + discount * self.expected_values(values)
+        q = q.reshape(values.shape[:-1] + (self.n_states, self.n_actions))
+        return np.where(self.valid, q, -np.inf)
+
+    def bellman_backup(self, values, discount):
+        """One synchronous sweep: V(s) = max_a Q(s, a), terminals fixed at 0."""
+        new_values = self.q_values(values, discount).max(axis=-1)
+        new_values[..., self.terminal] = 0.0
+        return new_values
+
+    def greedy_policy(self, values, discount):
+        """Greedy action index per state (-1 for terminal states)."""
+        policy = np.argmax(self.q_values(values, discount), axis=-1)
+        policy[..., self.terminal] = -1
+        return policy
+
+    def policy_model(self, policy):
+        """
+        Transition matrix P_pi (CSR: indptr, indices, probs) and reward vector R_pi
+        of a deterministic policy given as one action index per state. A negative
+        index leaves the row empty with zero reward.
+        """
+        policy = np.asarray(policy)
+        acting = policy >= 0
+        rows = np.arange(self.n_states) * self.n_actions + np.where(acting, policy, 0)
+        lo = self.indptr[rows]
+        counts = np.where(acting, self.indptr[rows + 1] - lo, 0)
+
+        indptr = np.zeros(self.n_states + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        gather = np.repeat(lo - indptr[:-1], counts) + np.arange(indptr[-1])
+        rewards = np.where(acting, self.rewards[rows], 0.0)
+        return indptr, self.indices[gather], self.probs[gather], rewards
+
+    def compile(self):
+        return self
+
+    # MDP interface
+
+    def get_states(self):
+        return list(self.states)
+
+    def get_possible_actions(self, state):
+        i = self.state_index[state]
+        return [a for a, ok in zip(self.actions, self.valid[i]) if ok]
+
+    def is_terminal(self, state):
+        return bool(self.terminal[self.state_index[state]])
+
+    def get_reward(self, state, action, next_state):
+        return float(self.state_rewards[self.state_index[next_state]])
+
+    def get_transition_states_and_probs(self, state, action):
+        row = self.state_index[state] * self.n_actions + self.action_index[action]
+        lo, hi = self.indptr[row], self.indptr[row + 1]
+        return [(self.states[j], float(p)) for j, p in zip(self.indices[lo:hi], self.probs[lo:hi])]
+
 
 class MDP:
     def __init__(self, env: Environment):
         self.env = env
+        self._compiled = None
 
     def get_states(self):
-        states = []
-        for r in range(self.env.nrows):
-            for c in range(self.env.ncols):
-                if self.env.board[r][c] != '#':
-                    states.append((r, c))
-        return states
+        cells = np.flatnonzero(~self.env.walls)
+        return [self.env.cell_states[cell] for cell in cells.tolist()]
 
     def get_possible_actions(self, state):
         return self.env.get_possible_actions(state)
 
     def is_terminal(self, state):
         r, c = state
-        return isinstance(self.env.board[r][c], (int, float))
+        return self.env._terminal[r * self.env.ncols + c]
 
     def get_reward(self, state, action, next_state):
         r, c = next_state
-        if isinstance(self.env.board[r][c], (int, float)):
-            return self.env.board[r][c]
-        return 0.0
+        return self.env._rewards[r * self.env.ncols + c]
 
     def get_transition_states_and_probs(self, state, action):
 
-        r, c = state
-
         if action == 'exit':
             return [(state, 1.0)]
 
-        clockwise = self.env._get_clockwise_action(action)
-        counterclockwise = self.env._get_counterclockwise_action(action)
+        env = self.env
+        r, c = state
+        cell = r * env.ncols + c
+        moves = env._next_cells[cell]
+        a = env.action_index[action]
 
         outcomes = [
-            (action, self.env.action_success_prob),
-            (clockwise, self.env.clockwise_prob),
-            (counterclockwise, self.env.counterclockwise_prob),
-            (None, self.env.stay_prob),
+            (moves[a], env.action_success_prob),
+            (moves[CLOCKWISE[a]], env.clockwise_prob),
+            (moves[COUNTERCLOCKWISE[a]], env.counterclockwise_prob),
+            (cell, env.stay_prob),
         ]
 
         transition = {}
-        for act, prob in outcomes:
-            if act is None:
-                next_state = (r, c)
-            else:
-                next_state = self.env._calculate_new_state(r, c, act)
-
-            if next_state in transition:
-                transition[next_state] += prob
-            else:
-                transition[next_state] = prob
-
-        return list(transition.items())
+        for next_cell, prob in outcomes:
+            transition[next_cell] = transition.get(next_cell, 0.0) + prob
+
+        return [(env.cell_states[next_cell], prob) for next_cell, prob in transition.items()]
+
+    def compile(self) -> CompiledMDP:
+        """Array form of this MDP, built once and cached."""
+        if self._compiled is None:
+            self._compiled = CompiledMDP.from_env(self.env)
+        return self._compiled
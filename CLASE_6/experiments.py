@@ -0,0 +1,232 @@
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from loguru import logger
+from td_history import AppendableNpy
+
+COLUMNS = {
+    'cell': np.int32,      # row of cells.jsonl the episode belongs to
+    'episode': np.int32,
+    'reward': np.float64,  # NaN for agents whose run_episode only returns steps (TDLearning)
+    'steps': np.int32,
+}
+
+
+def make_grid(agents: dict, envs: dict, params: dict, seeds, num_episodes: int) -> list:
+    """
+    Cartesian product of agents x envs x hyperparameters x seeds.
+
+    agents maps a name to a class (or any callable(env, **params)) whose
+    instances have run_episode(); envs maps a name to an env factory; params
+    maps each hyperparameter to the list of values to try. Every cell is a dict
+    that run_experiments can execute.
+    """
+    names = list(params)
+    cells = []
+    for (agent_name, agent), (env_name, env), values, seed in itertools.product(
+            agents.items(), envs.items(), itertools.product(*params.values()), seeds):
+        cells.append({
+            'agent_name': agent_name, 'agent': agent,
+            'env_name': env_name, 'env': env,
+            'params': dict(zip(names, values)),
+            'seed': int(seed),
+            'num_episodes': num_episodes,
+        })
+    return cells
+
+
+def canonical(value):
+    """
+    JSON-ready form of a hyperparameter value that is the same on every run.
+
+    Mappings become lists of [repr(key), value] pairs sorted by key, so dicts
+    keyed by tuples (e.g. a TDLearning policy {(r, c): action}) can be saved
+    and hashed; sequences become lists, NumPy scalars and arrays plain Python
+    values, and anything else that JSON cannot hold its repr.
+    """
+    if isinstance(value, dict):
+        return sorted([repr(k), canonical(v)] for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    if isinstance(value, (np.generic, np.ndarray)):
+        return canonical(value.tolist())
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return repr(value)
+
+
+def canonical_params(params: dict) -> dict:
+    """params with every value passed through canonical (the names stay as keys)."""
+    return {name: canonical(value) for name, value in params.items()}
+
+
+def cell_key(cell: dict) -> str:
+    """Stable id of a cell: everything that affects its result, hashed."""
+    description = json.dumps(
+        [cell['agent_name'], cell['env_name'], canonical_params(cell['params']), cell['seed'],
+         cell['num_episodes']],
+        sort_keys=True,
+    )
+    return hashlib.sha1(description.encode('utf-8')).hexdigest()[:16]
+
+
+def _accepts_rng(factory) -> bool:
+    try:
+        return 'rng' in inspect.signature(factory).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _run_cell(cell: dict):
+    """Worker task: one (agent, env, params, seed) run. Returns (rewards, steps, seconds)."""
+    seed_sequence = np.random.SeedSequence(cell['seed'])
+    env_seed, agent_seed, legacy_seed = seed_sequence.spawn(3)
+    # Code that still draws from the global state gets a stream derived from the same seed
+    np.random.seed(legacy_seed.generate_state(4))
+
+    env_factory, agent_factory = cell['env'], cell['agent']
+    params = dict(cell['params'])
+    env = env_factory(rng=np.random.default_rng(env_seed)) if _accepts_rng(env_factory) else env_factory()
+    if _accepts_rng(agent_factory):
+        params['rng'] = np.random.default_rng(agent_seed)
+    agent = agent_factory(env, **params)
+
+    n = cell['num_episodes']
+    rewards = np.full(n, np.nan)
+    steps = np.zeros(n, dtype=np.int32)
+    start = time.perf_counter()
+    for episode in range(n):
+        result = agent.run_episode()
+        if isinstance(result, tuple):
+            rewards[episode], steps[episode] = result
+        else:
+            steps[episode] = result
+    return rewards, steps, time.perf_counter() - start
+
+
+class ResultsStore:
+    """
+    Columnar results of a sweep in one directory.
+
+    Per-episode columns (cell, episode, reward, steps) are appendable .npy files;
+    cells.jsonl lists the completed cells with their row range. A cell line is
+    only written after its rows are on disk, so on reopening anything past the
+    last listed cell is truncated and the listed cells are treated as done.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.cells_path = os.path.join(directory, 'cells.jsonl')
+
+        self.cells = []
+        if os.path.exists(self.cells_path):
+            with open(self.cells_path) as f:
+                self.cells = [json.loads(line) for line in f if line.strip()]
+        self.completed = {c['key'] for c in self.cells}
+        n_rows = self.cells[-1]['stop'] if self.cells else 0
+
+        self.columns = {}
+        for name, dtype in COLUMNS.items():
+            path = os.path.join(directory, f'{name}.npy')
+            keep_rows = n_rows if os.path.exists(path) else None
+            self.columns[name] = AppendableNpy(path, dtype=dtype, keep_rows=keep_rows)
+
+    def add(self, cell: dict, rewards: np.ndarray, steps: np.ndarray, seconds: float):
+        start = self.columns['reward'].n_rows
+        n = len(rewards)
+        self.columns['cell'].extend(np.full(n, len(self.cells)))
+        self.columns['episode'].extend(np.arange(n))
+        self.columns['reward'].extend(rewards)
+        self.columns['steps'].extend(steps)
+
+        record = {
+            'key': cell_key(cell), 'agent': cell['agent_name'], 'env': cell['env_name'],
+            'params': canonical_params(cell['params']), 'seed': cell['seed'],
+            'num_episodes': cell['num_episodes'],
+            'start': start, 'stop': start + n, 'seconds': seconds,
+        }
+        with open(self.cells_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        self.cells.append(record)
+        self.completed.add(record['key'])
+
+    def close(self):
+        for column in self.columns.values():
+            column.close()
+
+    def load(self) -> dict:
+        """Columns as memory-mapped arrays, plus the list of cell records under 'cells'."""
+        data = {name: column.load() for name, column in self.columns.items()}
+        data['cells'] = list(self.cells)
+        return data
+
+    def episodes_of(self, **filters) -> tuple:
+        """
+        (rewards, steps) of the cells matching every filter (agent, env, seed or a
+        hyperparameter), stacked as (n_cells, num_episodes) arrays.
+        """
+        rewards, steps = self.columns['reward'].load(), self.columns['steps'].load()
+        selected = [c for c in self.cells
+                    if all({**c['params'], **c}.get(k) == v for k, v in filters.items())]
+        return (np.array([rewards[c['start']:c['stop']] for c in selected]),
+                np.array([steps[c['start']:c['stop']] for c in selected]))
+
+
+def run_experiments(cells: list, results_dir: str, n_workers: int = None) -> ResultsStore:
+    """
+    Run every cell not yet in results_dir and append its per-episode rewards
+    and steps to the store as soon as it finishes.
+
+    Cells run in a process pool (n_workers defaults to the CPU count; 1 runs
+    them inline). Each run derives its env/agent Generators, and the global
+    np.random state of its worker, from its own seed only, so a cell gives the
+    same result whichever worker executes it and in whatever order.
+    """
+    store = ResultsStore(results_dir)
+    pending = [c for c in cells if cell_key(c) not in store.completed]
+    logger.info(f"{len(cells) - len(pending)} celdas ya completadas, {len(pending)} por ejecutar")
+
+    n_workers = n_workers or os.cpu_count()
+    try:
+        if n_workers <= 1:
+            for i, cell in enumerate(pending, start=1):
+                store.add(cell, *_run_cell(cell))
+                logger.info(f"[{i}/{len(pending)}] {cell['agent_name']} {cell['env_name']} "
+                            f"{cell['params']} seed={cell['seed']}")
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                futures = {pool.submit(_run_cell, cell): cell for cell in pending}
+                for i, future in enumerate(as_completed(futures), start=1):
+                    cell = futures[future]
+                    store.add(cell, *future.result())
+                    logger.info(f"[{i}/{len(pending)}] {cell['agent_name']} {cell['env_name']} "
+                                f"{cell['params']} seed={cell['seed']}")
+    finally:
+        store.close()
+    return store
+
+
+if __name__ == '__main__':
+    from cliff_walk_environment import CliffWalk
+    from sarsa_agent import SARSA
+
+    cells = make_grid(
+        agents={'SARSA': SARSA},
+        envs={'CliffWalk': CliffWalk},
+        params={'epsilon': [0.9, 0.99], 'gamma': [0.96, 1.0], 'alpha': [0.81]},
+        seeds=range(4),
+        num_episodes=500,
+    )
+    store = run_experiments(cells, 'results_sarsa')
+
+    for epsilon in (0.9, 0.99):
+        rewards, _ = store.episodes_of(epsilon=epsilon, gamma=0.96)
+        logger.info(f"epsilon={epsilon}: recompensa media ultimos 100 episodios "
+                    f"{rewards[:, -100:].mean():.1f} (+/- {rewards[:, -100:].mean(axis=1).std():.1f})")
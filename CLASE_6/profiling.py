@@ -0,0 +1,149 @@
+import cProfile
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+from loguru import logger
+
+PHASES = ('env.step', 'choose_action', 'update', 'bookkeeping')
+
+
+class Profiler:
+    """
+    Opt-in per-phase timing of a training run.
+
+    Training loops take `profiler=None`. When one is given, the methods named
+    by the loop (env.do_action, choose_action, the update...) are wrapped on
+    the instances for the duration of the run and their time is accumulated
+    with perf_counter_ns per phase. Wrapped calls may nest: a phase is charged
+    its exclusive time, and whatever the run spends outside every wrapped call
+    (episode loop, logging, history) is reported as bookkeeping. Without a
+    profiler nothing is wrapped, so the loops run exactly as before.
+
+    Counters (episodes, steps, updates) come from one call per episode.
+    Every `every` episodes, and at the end of the run, the breakdown is logged
+    and, with `json_path`, appended to it as one JSON line. `cprofile_path`
+    additionally runs cProfile over the session and dumps its stats there
+    (for snakeviz/pstats; py-spy needs nothing from the process).
+    """
+
+    def __init__(self, every: int = None, json_path: str = None, cprofile_path: str = None):
+        self.every = every
+        self.json_path = json_path
+        self.cprofile_path = cprofile_path
+        self.reset()
+
+    def reset(self):
+        self.totals = dict.fromkeys(PHASES, 0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.counters = {'episodes': 0, 'steps': 0, 'updates': 0}
+        self.name = None
+        self._stack = []
+        self._start = None
+        self._elapsed = 0
+
+    def _wrap(self, func, phase):
+        totals, calls, stack = self.totals, self.calls, self._stack
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = clock()
+            stack.append(0)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                totals[phase] += elapsed - stack.pop()
+                calls[phase] += 1
+                if stack:
+                    stack[-1] += elapsed
+
+        return timed
+
+    @contextmanager
+    def session(self, name: str, hooks):
+        """
+        Time one run. hooks is a list of (obj, method_name, phase): each method is
+        replaced on the instance by a timed wrapper and restored on exit.
+        """
+        self.name = name
+        patched = []
+        for obj, method, phase in hooks:
+            if phase not in self.totals:
+                self.totals[phase] = self.calls[phase] = 0
+            own = obj.__dict__.get(method)
+            setattr(obj, method, self._wrap(getattr(obj, method), phase))
+            patched.append((obj, method, own))
+
+        profile = cProfile.Profile() if self.cprofile_path else None
+        if profile is not None:
+            profile.enable()
+        self._start = time.perf_counter_ns()
+        try:
+            yield self
+        finally:
+            self._elapsed += time.perf_counter_ns() - self._start
+            self._start = None
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(self.cprofile_path)
+            for obj, method, own in reversed(patched):
+                if own is None:
+                    delattr(obj, method)
+                else:
+                    setattr(obj, method, own)
+            self.emit()
+
+    def episode(self, steps: int, updates: int = None):
+        """Count one finished episode (updates defaults to one per step)."""
+        self.counters['episodes'] += 1
+        self.counters['steps'] += steps
+        self.counters['updates'] += steps if updates is None else updates
+        if self.every and self.counters['episodes'] % self.every == 0:
+            self.emit()
+
+    def elapsed_ns(self) -> int:
+        running = time.perf_counter_ns() - self._start if self._start is not None else 0
+        return self._elapsed + running
+
+    def summary(self) -> dict:
+        """Seconds, share of the run, calls and ns per call for every phase, plus the counters."""
+        elapsed = self.elapsed_ns()
+        totals = dict(self.totals)
+        totals['bookkeeping'] += max(elapsed - sum(self.totals.values()), 0)
+        phases = {
+            phase: {
+                'seconds': ns / 1e9,
+                'share': ns / elapsed if elapsed else 0.0,
+                'calls': self.calls[phase],
+                'ns_per_call': ns / self.calls[phase] if self.calls[phase] else None,
+            }
+            for phase, ns in totals.items()
+        }
+        seconds = elapsed / 1e9
+        return {
+            'name': self.name,
+            'seconds': seconds,
+            'phases': phases,
+            'counters': dict(self.counters),
+            'steps_per_sec': self.counters['steps'] / seconds if seconds else None,
+        }
+
+    def emit(self):
+        summary = self.summary()
+        breakdown = ' | '.join(
+            f"{phase} {p['share']:.1%} ({p['seconds']:.3f} s)" for phase, p in summary['phases'].items()
+        )
+        counters = summary['counters']
+        logger.info(f"[{summary['name']}] {counters['episodes']} episodios, {counters['steps']} pasos, "
+                    f"{counters['updates']} actualizaciones en {summary['seconds']:.3f} s: {breakdown}")
+        if self.json_path is not None:
+            with open(self.json_path, 'a') as f:
+                f.write(json.dumps(summary) + '\n')
+
+
+def profile_session(profiler: Profiler, name: str, hooks):
+    """profiler.session(name, hooks), or a no-op context when profiling is off."""
+    if profiler is None:
+        return nullcontext()
+    return profiler.session(name, hooks)
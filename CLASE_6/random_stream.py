@@ -0,0 +1,69 @@
+import numpy as np
+
+
+class RandomStream:
+    """
+    Scalar random draws served from blocks drawn in bulk.
+
+    A np.random.Generator call costs about a microsecond however many numbers
+    it returns, so environments and agents that need one number per step
+    take it from a block of `block_size` uniforms refilled in one call.
+
+    `source` is a np.random.Generator (or None for the legacy global state,
+    so code seeded with np.random.seed stays reproducible). Give every env,
+    agent or worker its own Generator, e.g. from SeedSequence.spawn, to get
+    independent streams.
+    """
+
+    def __init__(self, source: np.random.Generator = None, block_size: int = 4096):
+        self._source = source
+        self.block_size = block_size
+        self._block = []
+        self._position = 0
+
+    @property
+    def source(self):
+        # Resolved on use so streams on the global state can still be pickled
+        return self._source if self._source is not None else np.random
+
+    def random(self, size=None):
+        """One uniform in [0, 1), or an array of them when size is given."""
+        if size is not None:
+            return self.source.random(size)
+        if self._position == len(self._block):
+            self._block = self.source.random(self.block_size).tolist()
+            self._position = 0
+        u = self._block[self._position]
+        self._position += 1
+        return u
+
+    def integers(self, n: int, size=None):
+        """Uniform integer in [0, n), or an array of them when size is given."""
+        if size is not None:
+            if hasattr(self.source, 'integers'):
+                return self.source.integers(n, size=size)
+            return self.source.randint(n, size=size)
+        return min(int(self.random() * n), n - 1)
+
+    def choice(self, options, size=None):
+        """Uniform pick from a sequence (or from range(options) when it is an int)."""
+        if size is not None:
+            return self.source.choice(options, size=size)
+        if isinstance(options, (int, np.integer)):
+            return self.integers(options)
+        return options[self.integers(len(options))]
+
+    def categorical(self, probs) -> int:
+        """Index drawn with the given probabilities."""
+        u = self.random()
+        total = 0.0
+        for i, p in enumerate(probs):
+            total += p
+            if u < total:
+                return i
+        return len(probs) - 1
+
+
+def as_stream(rng) -> RandomStream:
+    """Wrap a Generator (or None) in a RandomStream; streams are returned as they are."""
+    return rng if isinstance(rng, RandomStream) else RandomStream(rng)
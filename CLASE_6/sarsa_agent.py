@@ -1,6 +1,10 @@
 import numpy as np
 from loguru import logger
 from cliff_walk_environment import CliffWalk
+from q_table import QTable
+from eligibility_traces import EligibilityTraces
+from random_stream import as_stream
+from profiling import Profiler, profile_session
 
 
 class SARSA:
@@ -9,19 +13,25 @@ class SARSA:
 
     Updates Q-values using: Q(s,a) <- (1-alpha)*Q(s,a) + alpha*[R + gamma*Q(s',a')]
     where a' is the action actually chosen in s' (on-policy).
+
+    With lam > 0 it runs SARSA(lambda): the TD error of every step is applied
+    to all recently visited pairs through eligibility traces.
     """
 
-    def __init__(self, env, epsilon: float = 0.9, gamma: float = 0.96, alpha: float = 0.81):
+    def __init__(self, env, epsilon: float = 0.9, gamma: float = 0.96, alpha: float = 0.81,
+                 lam: float = 0.0, trace_cutoff: float = 1e-3, rng: np.random.Generator = None):
         self.env = env
+        self.rng = as_stream(rng)
         self.epsilon = epsilon
         self.gamma = gamma
         self.alpha = alpha
+        self.lam = lam
 
         # Initialize Q(s, a) = 0 for all state-action pairs
-        self.Q = {}
-        for state in env.get_states():
-            for action in env.get_possible_actions(state):
-                self.Q[(state, action)] = 0.0
+        self.Q = QTable.from_env(env)
+        self.traces = None
+        if lam > 0:
+            self.traces = EligibilityTraces(self.Q.table.size, gamma * lam, cutoff=trace_cutoff)
 
     def choose_action(self, state):
         """
@@ -29,32 +39,24 @@ class SARSA:
         With probability epsilon: exploit (best action).
         With probability 1-epsilon: explore (random action).
         """
-        actions = self.env.get_possible_actions(state)
-
-        if np.random.random() < self.epsilon:
-            # Exploit: choose best action
-            best_action = None
-            best_value = float('-inf')
-            for action in actions:
-                q_val = self.Q.get((state, action), 0.0)
-                if q_val > best_value:
-                    best_value = q_val
-                    best_action = action
-            return best_action
-        else:
-            # Explore: random action
-            return np.random.choice(actions)
+        return self.Q.epsilon_greedy(state, 1 - self.epsilon, self.rng)
 
     def action_function(self, state1, action1, reward, state2, action2):
         """
         SARSA update rule.
         Q(s1, a1) <- (1-alpha)*Q(s1, a1) + alpha*[R + gamma*Q(s2, a2)]
         """
-        old_q = self.Q.get((state1, action1), 0.0)
-        next_q = self.Q.get((state2, action2), 0.0)
+        q = self.Q.table
+        s1, a1 = self.Q.state_index[state1], self.Q.action_index[action1]
+        next_q = q[self.Q.state_index[state2], self.Q.action_index[action2]]
+
+        if self.traces is None:
+            q[s1, a1] = (1 - self.alpha) * q[s1, a1] + self.alpha * (reward + self.gamma * next_q)
+            return
 
-        self.Q[(state1, action1)] = (1 - self.alpha) * old_q + \
-                                     self.alpha * (reward + self.gamma * next_q)
+        delta = reward + self.gamma * next_q - q[s1, a1]
+        self.traces.visit(s1 * q.shape[1] + a1)
+        self.traces.update(q.reshape(-1), self.alpha * delta)
 
     def run_episode(self, max_steps: int = 1000):
         """
@@ -62,6 +64,8 @@ class SARSA:
         Returns (total_reward, steps).
         """
         self.env.reset()
+        if self.traces is not None:
+            self.traces.reset()
         state = self.env.get_current_state()
         action = self.choose_action(state)
 
@@ -86,35 +90,34 @@ class SARSA:
 
         return total_reward, steps
 
-    def train(self, num_episodes: int = 500):
-        """Train the agent for a number of episodes."""
+    def train(self, num_episodes: int = 500, profiler: Profiler = None):
+        """
+        Train the agent for a number of episodes.
+
+        With a Profiler, time is split into env.step, choose_action, update
+        (action_function) and bookkeeping (see profiling.py).
+        """
         rewards_history = []
+        hooks = [(self.env, 'do_action', 'env.step'), (self, 'choose_action', 'choose_action'),
+                 (self, 'action_function', 'update')]
 
-        for episode in range(num_episodes):
-            total_reward, steps = self.run_episode()
-            rewards_history.append(total_reward)
+        with profile_session(profiler, 'SARSA', hooks):
+            for episode in range(num_episodes):
+                total_reward, steps = self.run_episode()
+                rewards_history.append(total_reward)
+                if profiler is not None:
+                    profiler.episode(steps)
 
-            if (episode + 1) % 100 == 0:
-                avg_reward = np.mean(rewards_history[-100:])
-                logger.info(f"Episode {episode + 1}/{num_episodes} - "
-                           f"Avg Reward (last 100): {avg_reward:.1f} - Steps: {steps}")
+                if (episode + 1) % 100 == 0:
+                    avg_reward = np.mean(rewards_history[-100:])
+                    logger.info(f"Episode {episode + 1}/{num_episodes} - "
+                               f"Avg Reward (last 100): {avg_reward:.1f} - Steps: {steps}")
 
         return rewards_history
 
     def get_policy(self):
         """Extract the greedy policy from the Q-table."""
-        policy = {}
-        for state in self.env.get_states():
-            actions = self.env.get_possible_actions(state)
-            best_action = None
-            best_value = float('-inf')
-            for action in actions:
-                q_val = self.Q.get((state, action), 0.0)
-                if q_val > best_value:
-                    best_value = q_val
-                    best_action = action
-            policy[state] = best_action
-        return policy
+        return self.Q.greedy_policy()
 
     def print_policy(self):
         """Print the learned policy as a grid."""
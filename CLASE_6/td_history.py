@@ -0,0 +1,222 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+NPY_HEADER_SIZE = 128  # fixed, so the header can be rewritten in place as the array grows
+
+
+class AppendableNpy:
+    """
+    .npy file that grows by rows (or by elements when n_columns is None).
+
+    Rows are buffered in a preallocated chunk and written to the end of the
+    file when it fills up. Every flush rewrites the header with the current
+    row count, so the file is a valid .npy that np.load(path, mmap_mode='r')
+    can open during or after training.
+
+    With keep_rows set, an existing file is reopened and truncated to its
+    first keep_rows rows before appending, which lets an interrupted writer
+    resume from its last committed row.
+    """
+
+    def __init__(self, filepath: str, n_columns: int = None, chunk_rows: int = 256,
+                 dtype=np.float64, keep_rows: int = None):
+        self.filepath = filepath
+        self.n_columns = n_columns
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.row_shape = () if n_columns is None else (n_columns,)
+        self.row_bytes = self.dtype.itemsize * (n_columns or 1)
+        self._chunk = np.empty((chunk_rows,) + self.row_shape, dtype=self.dtype)
+        self._pending = 0
+
+        if keep_rows is None:
+            self.n_rows = 0
+            self._file = open(filepath, 'wb')
+        else:
+            self.n_rows = keep_rows
+            self._file = open(filepath, 'r+b')
+            self._file.truncate(NPY_HEADER_SIZE + keep_rows * self.row_bytes)
+        self._write_header()
+
+    def _write_header(self):
+        header = repr({'descr': self.dtype.str, 'fortran_order': False,
+                       'shape': (self.n_rows,) + self.row_shape})
+        header = header.ljust(NPY_HEADER_SIZE - len(NPY_MAGIC) - 3) + '\n'
+        self._file.seek(0)
+        self._file.write(NPY_MAGIC)
+        self._file.write(np.uint16(len(header)).astype('<u2').tobytes())
+        self._file.write(header.encode('latin1'))
+
+    def append(self, row):
+        self._chunk[self._pending] = row
+        self._pending += 1
+        if self._pending == len(self._chunk):
+            self.flush()
+
+    def extend(self, rows: np.ndarray):
+        """Append many rows at once (written straight to the file)."""
+        self.flush()
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        self._file.seek(0, 2)
+        self._file.write(rows.tobytes())
+        self.n_rows += len(rows)
+        self._write_header()
+        self._file.flush()
+
+    def flush(self):
+        if self._file.closed:
+            return
+        if self._pending:
+            self._file.seek(0, 2)
+            self._file.write(self._chunk[:self._pending].tobytes())
+            self.n_rows += self._pending
+            self._pending = 0
+        self._write_header()
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def load(self, mmap_mode: str = 'r') -> np.ndarray:
+        self.flush()
+        return np.load(self.filepath, mmap_mode=mmap_mode)
+
+
+class HistorySink(ABC):
+    """
+    Receives the value function after every training episode.
+
+    TDLearning.train calls start() with the state order of the value arrays,
+    record() once per episode and close() at the end, and returns the sink.
+    Values are passed as a reused array: sinks copy what they keep.
+    Subclasses implement record(); one that does not cannot be instantiated.
+    """
+
+    def start(self, states: list):
+        self.states = list(states)
+
+    @abstractmethod
+    def record(self, episode: int, values: np.ndarray):
+        ...
+
+    def close(self):
+        pass
+
+    def as_dicts(self, snapshots: np.ndarray) -> list:
+        """Rows of a snapshot array as {state: value} dicts, like the old train history."""
+        return [dict(zip(self.states, row.tolist())) for row in snapshots]
+
+
+class SnapshotHistory(HistorySink):
+    """
+    Copy of V every `every` episodes, plus the final one.
+
+    With `filepath` the snapshots are streamed to an appendable .npy file,
+    so memory stays constant however long the run is.
+    """
+
+    def __init__(self, every: int = 1, filepath: str = None, chunk_rows: int = 256):
+        self.every = every
+        self.filepath = filepath
+        self.chunk_rows = chunk_rows
+
+    def start(self, states):
+        super().start(states)
+        self.episodes = []
+        self._last_episode = -1
+        self._last_values = np.zeros(len(self.states))
+        if self.filepath is not None:
+            self._store = AppendableNpy(self.filepath, len(self.states), self.chunk_rows)
+        else:
+            self._store = []
+
+    def record(self, episode, values):
+        self._last_episode = episode
+        if (episode + 1) % self.every == 0:
+            self._append(episode, values)
+        else:
+            self._last_values[:] = values
+
+    def _append(self, episode, values):
+        self.episodes.append(episode)
+        if self.filepath is not None:
+            self._store.append(values)
+        else:
+            self._store.append(values.copy())
+
+    def close(self):
+        if self._last_episode >= 0 and (not self.episodes or self.episodes[-1] != self._last_episode):
+            self._append(self._last_episode, self._last_values)
+        if self.filepath is not None:
+            self._store.close()
+
+    @property
+    def snapshots(self) -> np.ndarray:
+        """(n_snapshots, n_states) array; memory-mapped when streamed to disk."""
+        if self.filepath is not None:
+            return self._store.load()
+        return np.array(self._store).reshape(-1, len(self.states))
+
+
+class RingBufferHistory(HistorySink):
+    """Last `capacity` snapshots of V in a preallocated (capacity, n_states) array."""
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+
+    def start(self, states):
+        super().start(states)
+        self._buffer = np.empty((self.capacity, len(self.states)))
+        self._episodes = np.empty(self.capacity, dtype=np.int64)
+        self._count = 0
+
+    def record(self, episode, values):
+        slot = self._count % self.capacity
+        self._buffer[slot] = values
+        self._episodes[slot] = episode
+        self._count += 1
+
+    def _order(self):
+        if self._count <= self.capacity:
+            return np.arange(self._count)
+        return (np.arange(self.capacity) + self._count) % self.capacity
+
+    @property
+    def episodes(self) -> np.ndarray:
+        return self._episodes[self._order()]
+
+    @property
+    def snapshots(self) -> np.ndarray:
+        """Retained snapshots, oldest first."""
+        return self._buffer[self._order()]
+
+
+class MaxDeltaHistory(HistorySink):
+    """
+    Only max_s |V_k(s) - V_{k-1}(s)| per episode, the usual convergence curve.
+
+    Memory is one float per episode (preallocated when num_episodes is given)
+    plus the previous value vector.
+    """
+
+    def __init__(self, num_episodes: int = None):
+        self.num_episodes = num_episodes
+
+    def start(self, states):
+        super().start(states)
+        self._previous = np.zeros(len(self.states))
+        self._deltas = np.empty(self.num_episodes or 1024)
+        self._count = 0
+
+    def record(self, episode, values):
+        if self._count == len(self._deltas):
+            self._deltas = np.resize(self._deltas, 2 * len(self._deltas))
+        self._deltas[self._count] = np.max(np.abs(values - self._previous))
+        self._previous[:] = values
+        self._count += 1
+
+    @property
+    def deltas(self) -> np.ndarray:
+        return self._deltas[:self._count]
@@ -1,11 +1,17 @@
 import numpy as np
 from loguru import logger
+from td_history import HistorySink
+from eligibility_traces import EligibilityTraces
+from random_stream import as_stream
+from grid_tables import TabularGrid, MOVEMENT_ACTIONS
+from profiling import Profiler, profile_session
 
 
-class GridWorld10x10:
+class GridWorld10x10(TabularGrid):
     """10x10 GridWorld environment for TD Learning."""
 
-    def __init__(self):
+    def __init__(self, rng: np.random.Generator = None):
+        self.rng = as_stream(rng)
         self.nrows = 10
         self.ncols = 10
         self.initial_state = (0, 0)
@@ -13,6 +19,7 @@ class GridWorld10x10:
 
         self._initialize_board()
         self._initialize_obstacles()
+        self._build_tables()
 
         self.actions = ['up', 'down', 'left', 'right']
         self.action_map = {
@@ -31,6 +38,9 @@ class GridWorld10x10:
             'down': 0.2,
             'left': 0.2
         }
+        self._success_probs = [1 - self.noise[a] for a in MOVEMENT_ACTIONS]
+        self._other_actions = [[d for d in range(len(MOVEMENT_ACTIONS)) if d != a]
+                               for a in range(len(MOVEMENT_ACTIONS))]
 
     def _initialize_board(self):
         self.board = [[' ' for _ in range(self.ncols)] for _ in range(self.nrows)]
@@ -48,72 +58,37 @@ class GridWorld10x10:
         for r, c in obstacles:
             self.board[r][c] = '#'
 
-    def _calculate_new_state(self, r, c, action):
-        if action not in self.action_map:
-            return (r, c)
-        dr, dc = self.action_map[action]
-        new_r, new_c = r + dr, c + dc
-
-        if (new_r < 0 or new_r >= self.nrows or
-            new_c < 0 or new_c >= self.ncols or
-            self.board[new_r][new_c] == '#'):
-            return (r, c)
-
-        return (new_r, new_c)
-
     def get_current_state(self):
         return self.current_state
 
-    def get_possible_actions(self, state):
-        r, c = state
-        if isinstance(self.board[r][c], (int, float)):
-            return ['exit']
-        return ['up', 'down', 'left', 'right']
-
     def do_action(self, action):
         """Execute action with stochastic noise. Returns (reward, new_state)."""
         r, c = self.current_state
+        cell = r * self.ncols + c
 
-        if self.is_terminal():
+        if self._terminal[cell]:
             if action == 'exit':
-                reward = self.board[r][c]
-                return reward, self.current_state
+                return self._rewards[cell], self.current_state
             return 0, self.current_state
 
         # Stochastic execution based on noise factor
-        noise = self.noise[action]
-        other_actions = [a for a in self.actions if a != action]
-
-        rand = np.random.random()
-        if rand < (1 - noise):
-            executed = action
+        a = self.action_index[action]
+        if self.rng.random() < self._success_probs[a]:
+            executed = a
         else:
             # Noise: equal probability among other 3 actions
-            executed = np.random.choice(other_actions)
+            executed = self.rng.choice(self._other_actions[a])
 
-        new_state = self._calculate_new_state(r, c, executed)
+        new_cell = self._next_cells[cell][executed]
 
-        reward = 0
-        if isinstance(self.board[new_state[0]][new_state[1]], (int, float)):
-            reward = self.board[new_state[0]][new_state[1]]
-
-        self.current_state = new_state
-        return reward, new_state
+        self.current_state = self.cell_states[new_cell]
+        return self._rewards[new_cell], self.current_state
 
     def reset(self):
         self.current_state = self.initial_state
 
-    def is_terminal(self):
-        r, c = self.current_state
-        return isinstance(self.board[r][c], (int, float))
-
     def get_states(self):
-        states = []
-        for r in range(self.nrows):
-            for c in range(self.ncols):
-                if self.board[r][c] != '#':
-                    states.append((r, c))
-        return states
+        return [self.cell_states[cell] for cell in np.flatnonzero(~self.walls).tolist()]
 
 
 class TDLearning:
@@ -121,24 +96,36 @@ class TDLearning:
     Temporal Difference Learning TD(0) for estimating V^pi.
     Learns state values by following a given policy
     with unknown stochastic transitions.
+
+    With lam > 0 it runs TD(lambda) with eligibility traces over the states.
     """
 
-    def __init__(self, env: GridWorld10x10, policy: dict, alpha: float = 0.7, gamma: float = 0.96):
+    def __init__(self, env: GridWorld10x10, policy: dict, alpha: float = 0.7, gamma: float = 0.96,
+                 lam: float = 0.0, trace_cutoff: float = 1e-3):
         self.env = env
         self.policy = policy  # dict: state (r, c) -> action
         self.alpha = alpha
         self.gamma = gamma
+        self.lam = lam
 
         # Initialize V(s) = 0 for all states
         self.V = {}
         for state in env.get_states():
             self.V[state] = 0.0
 
+        self.traces = None
+        if lam > 0:
+            self.state_index = {s: i for i, s in enumerate(self.V)}
+            self.traces = EligibilityTraces(len(self.V), gamma * lam, cutoff=trace_cutoff)
+
     def run_episode(self, max_steps: int = 1000):
         """
         Run one episode following the policy, updating V(s) at each step.
         Returns the number of steps taken.
         """
+        if self.traces is not None:
+            return self._run_episode_traces(max_steps)
+
         self.env.reset()
         steps = 0
 
@@ -164,53 +151,95 @@ class TDLearning:
 
         return steps
 
-    def train(self, num_episodes: int = 1000):
+    def _run_episode_traces(self, max_steps: int):
+        """TD(lambda) episode: V is updated as an array and written back to the dict at the end."""
+        self.env.reset()
+        self.traces.reset()
+        values = np.fromiter(self.V.values(), dtype=np.float64, count=len(self.V))
+        steps = 0
+
+        while not self.env.is_terminal() and steps < max_steps:
+            state = self.env.get_current_state()
+            action = self.policy.get(state, 'right')  # fallback action
+
+            reward, new_state = self.env.do_action(action)
+
+            s, s_next = self.state_index[state], self.state_index[new_state]
+            delta = reward + self.gamma * values[s_next] - values[s]
+            self.traces.visit(s)
+            self.traces.update(values, self.alpha * delta)
+
+            steps += 1
+
+        self.V.update(zip(self.V, values.tolist()))
+
+        # If we landed on a terminal state, update its value with the reward (no future)
+        if self.env.is_terminal():
+            r, c = self.env.get_current_state()
+            self.V[(r, c)] = self.env.board[r][c]
+
+        return steps
+
+    def train(self, num_episodes: int = 1000, history: HistorySink = None,
+              profiler: Profiler = None):
         """
         Train for a given number of episodes.
-        Returns history of V values for convergence analysis.
-        """
-        history = []
 
-        for episode in range(num_episodes):
-            steps = self.run_episode()
+        Without `history`, returns a list with a dict snapshot of V per episode
+        (memory grows with episodes x states). Passing a HistorySink
+        (SnapshotHistory, RingBufferHistory, MaxDeltaHistory) records a bounded
+        summary instead, and the sink is returned.
 
-            # Save a snapshot of V for convergence analysis
-            snapshot = dict(self.V)
-            history.append(snapshot)
+        With a Profiler, time is split into env.step, update (the rest of
+        run_episode: policy lookup and TD update) and bookkeeping, which
+        includes the history snapshots (see profiling.py).
+        """
+        if history is None:
+            snapshots = []
+        else:
+            history.start(list(self.V))
+            values = np.empty(len(self.V))
+        hooks = [(self.env, 'do_action', 'env.step'), (self, 'run_episode', 'update')]
+
+        with profile_session(profiler, 'TDLearning', hooks):
+            for episode in range(num_episodes):
+                steps = self.run_episode()
+                if profiler is not None:
+                    profiler.episode(steps)
+
+                # Save a snapshot of V for convergence analysis
+                if history is None:
+                    snapshots.append(dict(self.V))
+                else:
+                    values[:] = np.fromiter(self.V.values(), dtype=np.float64, count=len(values))
+                    history.record(episode, values)
 
-            if (episode + 1) % 100 == 0:
-                logger.info(f"Episode {episode + 1}/{num_episodes} - Steps: {steps}")
+                if (episode + 1) % 100 == 0:
+                    logger.info(f"Episode {episode + 1}/{num_episodes} - Steps: {steps}")
 
+        if history is None:
+            return snapshots
+        history.close()
         return history
 
     def derive_policy(self):
         """
         Derive a greedy policy from learned V(s).
-        For each state, pick the action that leads to the highest V(s').
+        For each state, pick the action that leads to the highest V(s'),
+        looked up for all states at once in the env's next_state table.
         Returns dict: state -> best action.
         """
-        new_policy = {}
-        actions = ['up', 'down', 'left', 'right']
-
-        for state in self.env.get_states():
-            r, c = state
-            if isinstance(self.env.board[r][c], (int, float)):
-                new_policy[state] = 'exit'
-                continue
-
-            best_action = None
-            best_value = float('-inf')
-
-            for action in actions:
-                next_state = self.env._calculate_new_state(r, c, action)
-                value = self.V.get(next_state, 0.0)
-                if value > best_value:
-                    best_value = value
-                    best_action = action
-
-            new_policy[state] = best_action
-
-        return new_policy
+        env = self.env
+        cells = np.array([r * env.ncols + c for r, c in self.V], dtype=np.int64)
+        values = np.zeros(env.nrows * env.ncols)
+        values[cells] = np.fromiter(self.V.values(), dtype=np.float64, count=len(cells))
+
+        # argmax keeps the first of tied actions, like the strict '>' scan it replaces
+        best = np.argmax(values[env.next_state[cells]], axis=1)
+        return {
+            state: 'exit' if terminal else MOVEMENT_ACTIONS[a]
+            for state, terminal, a in zip(self.V, env.terminal[cells].tolist(), best.tolist())
+        }
 
     def print_values(self):
         """Print the value function as a grid."""
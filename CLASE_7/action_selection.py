@@ -0,0 +1,100 @@
+import numpy as np
+
+# Action selection over Q-values: epsilon-greedy, softmax (Boltzmann) and UCB.
+#
+# Every rule takes either one state's row of Q-values and returns an action
+# index, or (the _rows versions) an (N, n_actions) array and returns N indices.
+# Ties between the best actions are broken uniformly at random, so a table of
+# equal values (e.g. at the start of training) does not keep sending the agent
+# the same way. The single-state versions only call rng.random(), which a
+# RandomStream serves from a pre-drawn block; the row versions draw all their
+# uniforms in one rng.random(shape) call. epsilon is the probability of exploring.
+
+
+def _pick(n: int, rng) -> int:
+    """Uniform index in [0, n) from one uniform draw."""
+    return min(int(rng.random() * n), n - 1)
+
+
+def random_argmax(values, rng) -> int:
+    """Index of the largest value, ties broken at random."""
+    values = values.tolist() if isinstance(values, np.ndarray) else list(values)
+    best = max(values)
+    ties = [i for i, v in enumerate(values) if v == best]
+    return ties[0] if len(ties) == 1 else ties[_pick(len(ties), rng)]
+
+
+def random_argmax_rows(values: np.ndarray, rng) -> np.ndarray:
+    """Row-wise random_argmax: random noise on the tied maxima, -1 elsewhere, then argmax."""
+    values = np.asarray(values)
+    best = values == values.max(axis=1, keepdims=True)
+    return np.argmax(np.where(best, rng.random(values.shape), -1.0), axis=1)
+
+
+def epsilon_greedy(values, epsilon: float, rng) -> int:
+    """Random action with probability epsilon, a best action otherwise."""
+    if rng.random() < epsilon:
+        return _pick(len(values), rng)
+    return random_argmax(values, rng)
+
+
+def epsilon_greedy_rows(values: np.ndarray, epsilon: float, rng) -> np.ndarray:
+    """epsilon_greedy for every row, from one block of uniforms."""
+    values = np.asarray(values)
+    n_rows, n_actions = values.shape
+    # Per row: tie-breaking noise, explore draw, random action
+    draws = rng.random((n_rows, n_actions + 2))
+    best = values == values.max(axis=1, keepdims=True)
+    greedy = np.argmax(np.where(best, draws[:, :n_actions], -1.0), axis=1)
+    explore = draws[:, n_actions] < epsilon
+    random_actions = np.minimum((draws[:, n_actions + 1] * n_actions).astype(np.int64), n_actions - 1)
+    return np.where(explore, random_actions, greedy)
+
+
+def _boltzmann(values: np.ndarray, temperature: float) -> np.ndarray:
+    # Shifted by the maximum so large Q-values do not overflow
+    logits = (values - values.max(axis=-1, keepdims=True)) / temperature
+    return np.exp(logits)
+
+
+def softmax(values, temperature: float, rng) -> int:
+    """Action drawn with probability proportional to exp(Q / temperature)."""
+    weights = _boltzmann(np.asarray(values, dtype=np.float64), temperature).tolist()
+    u = rng.random() * sum(weights)
+    total = 0.0
+    for i, w in enumerate(weights):
+        total += w
+        if u < total:
+            return i
+    return len(weights) - 1
+
+
+def softmax_rows(values: np.ndarray, temperature: float, rng) -> np.ndarray:
+    """softmax for every row: one uniform per row against the cumulative weights."""
+    cumulative = np.cumsum(_boltzmann(np.asarray(values, dtype=np.float64), temperature), axis=1)
+    u = rng.random(len(cumulative)) * cumulative[:, -1]
+    return np.minimum((u[:, None] >= cumulative).sum(axis=1), cumulative.shape[1] - 1)
+
+
+def _ucb_scores(values: np.ndarray, counts: np.ndarray, c: float) -> np.ndarray:
+    # Untried actions score +inf, so each one is tried once before any bonus applies
+    total = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bonus = c * np.sqrt(np.log(np.maximum(total, 1)) / counts)
+    return np.where(counts > 0, values + bonus, np.inf)
+
+
+def ucb(values, counts, c: float, rng) -> int:
+    """
+    Upper-confidence-bound action: Q(s, a) + c * sqrt(ln N(s) / N(s, a)).
+
+    counts holds the visits N(s, a) of the state's actions (kept by the caller).
+    """
+    scores = _ucb_scores(np.asarray(values, dtype=np.float64), np.asarray(counts), c)
+    return random_argmax(scores, rng)
+
+
+def ucb_rows(values: np.ndarray, counts: np.ndarray, c: float, rng) -> np.ndarray:
+    """ucb for every row of values, with the matching rows of counts."""
+    scores = _ucb_scores(np.asarray(values, dtype=np.float64), np.asarray(counts), c)
+    return random_argmax_rows(scores, rng)
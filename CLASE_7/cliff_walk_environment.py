@@ -1,5 +1,6 @@
 import numpy as np
 from loguru import logger
+from grid_tables import move_table
 
 
 class CliffWalk:
@@ -34,6 +35,26 @@ class CliffWalk:
 
         self.goal = (5, 11)
 
+        # Lookup tables over flat cells (r * ncols + c): stepping into the cliff
+        # is resolved in next_state as a jump back to the start
+        n_cells = self.nrows * self.ncols
+        rows, cols = np.divmod(np.arange(n_cells), self.ncols)
+        self.cell_states = list(zip(rows.tolist(), cols.tolist()))
+        self.action_index = {a: i for i, a in enumerate(self.actions)}
+        self.cliff_mask = np.zeros(n_cells, dtype=bool)
+        self.cliff_mask[[r * self.ncols + c for r, c in self.cliff]] = True
+        self.terminal = np.zeros(n_cells, dtype=bool)
+        self.terminal[self.goal[0] * self.ncols + self.goal[1]] = True
+        self.rewards = np.where(self.cliff_mask, -100, -1)  # reward for entering each cell
+
+        moved = move_table(np.zeros((self.nrows, self.ncols), dtype=bool))
+        initial_cell = self.initial_state[0] * self.ncols + self.initial_state[1]
+        self.next_state = np.where(self.cliff_mask[moved], initial_cell, moved)
+
+        self._next_cells = self.next_state.tolist()
+        self._step_rewards = self.rewards[moved].tolist()
+        self._terminal = self.terminal.tolist()
+
     def get_current_state(self):
         return self.current_state
 
@@ -43,39 +64,26 @@ class CliffWalk:
     def do_action(self, action):
         """Execute action deterministically. Returns (reward, new_state)."""
         r, c = self.current_state
-        dr, dc = self.action_map[action]
-        new_r, new_c = r + dr, c + dc
-
-        if new_r < 0 or new_r >= self.nrows or new_c < 0 or new_c >= self.ncols:
-            new_r, new_c = r, c
-
-        new_state = (new_r, new_c)
-
-        if new_state in self.cliff:
-            self.current_state = self.initial_state
-            return -100, self.initial_state
+        cell = r * self.ncols + c
+        a = self.action_index[action]
 
-        self.current_state = new_state
-        return -1, new_state
+        self.current_state = self.cell_states[self._next_cells[cell][a]]
+        return self._step_rewards[cell][a], self.current_state
 
     def is_terminal(self):
-        return self.current_state == self.goal
+        r, c = self.current_state
+        return self._terminal[r * self.ncols + c]
 
     def reset(self):
         self.current_state = self.initial_state
 
     def get_states(self):
-        states = []
-        for r in range(self.nrows):
-            for c in range(self.ncols):
-                states.append((r, c))
-        return states
+        return list(self.cell_states)
 
     def get_reward(self, action, state, new_state):
         """Calculate reward for a transition."""
-        if new_state in self.cliff:
-            return -100
-        return -1
+        r, c = new_state
+        return int(self.rewards[r * self.ncols + c])
 
     def print_grid(self, path=None):
         """Print the grid with optional path visualization."""
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+class EligibilityTraces:
+    """
+    Sparse eligibility traces over the entries of a flat value array.
+
+    Only the live traces are stored: `indices[:n]` are the entries with a
+    trace and `traces[:n]` their values, with `position` mapping an entry back
+    to its slot. Each step decays every live trace by gamma * lambda and drops
+    the ones under `cutoff`, so the cost of a step grows with the number of
+    recently visited entries, not with the size of the table.
+
+    The same engine serves TD(lambda) (entries are states of V), SARSA(lambda)
+    and Watkins Q(lambda) (entries are flat state * n_actions + action cells of Q).
+    """
+
+    def __init__(self, size: int, decay: float, cutoff: float = 1e-3, replacing: bool = True):
+        self.decay = decay          # gamma * lambda
+        self.cutoff = cutoff
+        self.replacing = replacing  # replacing traces (e = 1) instead of accumulating (e += 1)
+
+        self.position = np.full(size, -1, dtype=np.int64)
+        self.indices = np.empty(16, dtype=np.int64)
+        self.traces = np.empty(16)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def reset(self):
+        """Drop every trace: start of an episode, or a non-greedy action in Watkins Q(lambda)."""
+        self.position[self.indices[:self.n]] = -1
+        self.n = 0
+
+    def visit(self, index: int):
+        """Mark an entry as just visited."""
+        slot = self.position[index]
+        if slot >= 0:
+            self.traces[slot] = 1.0 if self.replacing else self.traces[slot] + 1.0
+            return
+        if self.n == len(self.indices):
+            self.indices = np.resize(self.indices, 2 * self.n)
+            self.traces = np.resize(self.traces, 2 * self.n)
+        self.indices[self.n] = index
+        self.traces[self.n] = 1.0
+        self.position[index] = self.n
+        self.n += 1
+
+    def update(self, values: np.ndarray, step: float):
+        """values[i] += step * e(i) for every live trace, then decay the traces."""
+        live = self.indices[:self.n]
+        traces = self.traces[:self.n]
+        values[live] += step * traces
+        traces *= self.decay
+
+        keep = traces >= self.cutoff
+        if not keep.all():
+            self.position[live[~keep]] = -1
+            kept = int(keep.sum())
+            self.indices[:kept] = live[keep]
+            self.traces[:kept] = traces[keep]
+            self.n = kept
+            self.position[self.indices[:kept]] = np.arange(kept)
@@ -0,0 +1,71 @@
+import numpy as np
+
+MOVEMENT_ACTIONS = ['up', 'down', 'left', 'right']
+MOVES = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+# Direction index reached by turning the intended one (up, down, left, right)
+CLOCKWISE = [3, 2, 0, 1]
+COUNTERCLOCKWISE = [2, 3, 1, 0]
+
+
+def move_table(blocked: np.ndarray) -> np.ndarray:
+    """
+    next_cell[cell, a] of a (nrows, ncols) grid, cells flattened as r * ncols + c.
+    Moving off the board or into a blocked cell leaves the agent in place.
+    """
+    nrows, ncols = blocked.shape
+    cells = np.arange(nrows * ncols)
+    rows, cols = np.divmod(cells, ncols)
+    table = np.empty((nrows * ncols, len(MOVES)), dtype=np.int64)
+    for a, (dr, dc) in enumerate(MOVES):
+        r, c = rows + dr, cols + dc
+        inside = (r >= 0) & (r < nrows) & (c >= 0) & (c < ncols)
+        target = np.where(inside, r * ncols + c, cells)
+        table[:, a] = np.where(blocked.ravel()[target], cells, target)
+    return table
+
+
+class TabularGrid:
+    """
+    Lookup tables of a board-based grid environment, built once from `board`.
+
+    - next_state[cell, a]: cell reached by moving in direction a (MOVEMENT_ACTIONS order)
+    - terminal[cell]: numeric board cells
+    - rewards[cell]: board value of terminal cells, 0 elsewhere
+    - cell_states[cell]: the (r, c) tuple of each flat cell
+
+    Scalar stepping goes through list copies of the tables, so a transition is
+    one list index instead of dict lookups, bounds checks and board reads.
+    Call _build_tables again after editing `board`.
+    """
+
+    def _build_tables(self):
+        cells = [cell for row in self.board for cell in row]
+        self.walls = np.array([cell == '#' for cell in cells], dtype=bool)
+        self.terminal = np.array([isinstance(cell, (int, float)) for cell in cells], dtype=bool)
+        self.rewards = np.array([float(cell) if t else 0.0 for cell, t in zip(cells, self.terminal)])
+        self.next_state = move_table(self.walls.reshape(self.nrows, self.ncols))
+
+        rows, cols = np.divmod(np.arange(self.nrows * self.ncols), self.ncols)
+        self.cell_states = list(zip(rows.tolist(), cols.tolist()))
+        self.action_index = {a: i for i, a in enumerate(MOVEMENT_ACTIONS)}
+
+        self._next_cells = self.next_state.tolist()
+        self._terminal = self.terminal.tolist()
+        # Board values as they are (ints stay ints), 0 for non-terminal cells
+        self._rewards = [cell if t else 0 for cell, t in zip(cells, self._terminal)]
+
+    def _calculate_new_state(self, r, c, action):
+        a = self.action_index.get(action)
+        if a is None:
+            return (r, c)
+        return self.cell_states[self._next_cells[r * self.ncols + c][a]]
+
+    def get_possible_actions(self, state):
+        r, c = state
+        if self._terminal[r * self.ncols + c]:
+            return ['exit']
+        return ['up', 'down', 'left', 'right']
+
+    def is_terminal(self):
+        r, c = self.current_state
+        return self._terminal[r * self.ncols + c]
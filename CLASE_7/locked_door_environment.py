@@ -58,53 +58,71 @@ class LockedDoorEnv:
             'right': (0, 1)
         }
 
+        self._build_tables()
+
+    def _build_tables(self):
+        """
+        Tabulate the dynamics: next_state[s, a] (row in `states`), rewards[s, a]
+        and terminal[s]. Call it again after moving the key, ball or goal.
+        """
+        self.states = self.get_states()
+        self.state_index = {s: i for i, s in enumerate(self.states)}
+        self.action_index = {a: i for i, a in enumerate(self.actions)}
+
+        outcomes = [self._transition(s, a) for s in self.states for a in self.actions]
+        shape = (len(self.states), len(self.actions))
+        self.rewards = np.array([reward for reward, _ in outcomes]).reshape(shape)
+        self.next_state = np.array(
+            [self.state_index[new_state] for _, new_state in outcomes]).reshape(shape)
+        self.terminal = np.array([(s[0], s[1]) == self.goal_pos for s in self.states])
+
+        self._next_states = self.next_state.tolist()
+        self._rewards = self.rewards.tolist()
+        self._terminal = self.terminal.tolist()
+
     def get_current_state(self):
         return self.current_state
 
     def get_possible_actions(self, state):
         return self.actions
 
-    def _is_wall(self, r, c):
+    def _is_wall(self, r, c, door_open):
         """Check if position is a wall."""
         if r < 0 or r >= self.nrows or c < 0 or c >= self.ncols:
             return True
         if c == self.wall_col:
             if r == self.door_row:
-                _, _, _, _, door_open = self.current_state
                 return not door_open
             return True
         return False
 
-    def do_action(self, action):
-        """Execute action. Returns (reward, new_state)."""
-        r, c, has_ball, has_key, door_open = self.current_state
+    def _transition(self, state, action):
+        """(reward, new_state) of taking action in state, without moving the agent."""
+        r, c, has_ball, has_key, door_open = state
 
         if action in self.movement_actions:
             dr, dc = self.action_map[action]
             new_r, new_c = r + dr, c + dc
 
-            if self._is_wall(new_r, new_c):
-                self.current_state = (r, c, has_ball, has_key, door_open)
-                return -1, self.current_state
+            if self._is_wall(new_r, new_c, door_open):
+                return -1, state
 
-            self.current_state = (new_r, new_c, has_ball, has_key, door_open)
+            new_state = (new_r, new_c, has_ball, has_key, door_open)
 
             if (new_r, new_c) == self.goal_pos:
-                return 100, self.current_state
+                return 100, new_state
 
-            return -1, self.current_state
+            return -1, new_state
 
         elif action == 'pick_up':
             if not has_ball and (r, c) == self.ball_pos:
-                self.current_state = (r, c, True, has_key, door_open)
-                return 10, self.current_state
+                return 10, (r, c, True, has_key, door_open)
 
             if not has_key and (r, c) == self.key_pos:
                 if self.key_color == self.door_color:
-                    self.current_state = (r, c, has_ball, True, door_open)
-                    return 10, self.current_state
+                    return 10, (r, c, has_ball, True, door_open)
 
-            return -1, self.current_state
+            return -1, state
 
         elif action == 'open_door':
             is_adjacent = (
@@ -112,17 +130,22 @@ class LockedDoorEnv:
                 (r == self.door_row and c == self.wall_col + 1)
             )
             if is_adjacent and has_ball and has_key and not door_open:
-                self.current_state = (r, c, has_ball, has_key, True)
-                return 20, self.current_state
+                return 20, (r, c, has_ball, has_key, True)
 
             # Invalid open
-            return -1, self.current_state
+            return -1, state
 
-        return -1, self.current_state
+        return -1, state
+
+    def do_action(self, action):
+        """Execute action. Returns (reward, new_state)."""
+        s = self.state_index[self.current_state]
+        a = self.action_index[action]
+        self.current_state = self.states[self._next_states[s][a]]
+        return self._rewards[s][a], self.current_state
 
     def is_terminal(self):
-        r, c, _, _, _ = self.current_state
-        return (r, c) == self.goal_pos
+        return self._terminal[self.state_index[self.current_state]]
 
     def reset(self):
         self.current_state = (self.agent_start[0], self.agent_start[1], False, False, False)
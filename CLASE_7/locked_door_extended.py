@@ -1,5 +1,6 @@
 import numpy as np
 from loguru import logger
+from random_stream import as_stream
 
 
 class LockedDoorExtended:
@@ -12,7 +13,9 @@ class LockedDoorExtended:
 
     def __init__(self, nrows=4, ncols=9, wall_col=4, door_row=3,
                  agent_start=None, key_pos=None, ball_pos=None, goal_pos=None,
-                 key_color='blue', key_positions=None, randomize_start=False):
+                 key_color='blue', key_positions=None, randomize_start=False,
+                 rng: np.random.Generator = None):
+        self.rng = as_stream(rng)
         self.nrows = nrows
         self.ncols = ncols
         self.wall_col = wall_col
@@ -98,12 +101,12 @@ class LockedDoorExtended:
 
     def reset(self):
         if self.randomize_start:
-            start = self.start_positions[np.random.randint(len(self.start_positions))]
+            start = self.rng.choice(self.start_positions)
             self.agent_start = start
 
         # Randomize key position if multiple available
         if len(self.key_positions) > 1:
-            self.key_pos = self.key_positions[np.random.randint(len(self.key_positions))]
+            self.key_pos = self.rng.choice(self.key_positions)
 
         self.current_state = (
             self.agent_start[0], self.agent_start[1],
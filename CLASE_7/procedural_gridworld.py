@@ -0,0 +1,250 @@
+import numpy as np
+from random_stream import as_stream
+from grid_tables import MOVEMENT_ACTIONS, CLOCKWISE, COUNTERCLOCKWISE, move_table
+
+
+def bfs_distances(next_state: np.ndarray, start: int) -> np.ndarray:
+    """
+    Steps needed to reach every cell from `start` through a next_state table (-1 if unreachable).
+
+    Breadth-first search with the whole frontier expanded per NumPy call, so the
+    Python loop runs once per distance level rather than once per cell.
+    """
+    distances = np.full(len(next_state), -1, dtype=np.int64)
+    distances[start] = 0
+    frontier = np.array([start])
+    depth = 0
+    while frontier.size:
+        depth += 1
+        reached = np.unique(next_state[frontier])
+        frontier = reached[distances[reached] < 0]
+        distances[frontier] = depth
+    return distances
+
+
+def shortest_path(next_state: np.ndarray, distances: np.ndarray, target: int) -> list:
+    """Cells of one shortest path from the BFS start to `target`, walking the distances back."""
+    path = [target]
+    cell = target
+    for depth in range(distances[target] - 1, -1, -1):
+        neighbours = next_state[cell]
+        cell = int(neighbours[distances[neighbours] == depth][0])
+        path.append(cell)
+    return path[::-1]
+
+
+class ProceduralGridWorld:
+    """
+    Seeded random N x M GridWorld with the interface of GridWorld10x10.
+
+    - Obstacles: every cell is a wall with probability obstacle_density, except around the start.
+    - Terminals: n_goals cells worth goal_reward and n_traps worth trap_reward, placed
+      among the cells reachable from the start. placement='far' puts the goals on the
+      reachable cells farthest from the start, 'random' anywhere reachable. Traps are
+      kept off one shortest path to every goal (and to the key), so goals stay reachable.
+    - Slip model: (action_success_prob, clockwise_prob, counterclockwise_prob, stay_prob),
+      as in GridWorld10x10.
+    - Key/door layer: with n_doors > 0 a wall splits the board at wall_col with n_doors
+      doors ('D'), and a key ('K') is placed on the start side. Doors only open once the
+      key has been picked up (by stepping on it), so states become (r, c, has_key) and
+      the tables cover both layers: cell = has_key * nrows * ncols + r * ncols + c.
+      Goals go behind the wall whenever that side is reachable.
+
+    The layout is drawn from `seed` and the dynamics from `rng`, so the same seed always
+    gives the same board whatever the agent does. Everything is built with array
+    operations (board included, through a single tolist), so 10^6-cell worlds take
+    about a second. The dict-based MDP and MCM need (r, c) states, i.e. n_doors=0;
+    CompiledMDP.from_env handles both layers.
+    """
+
+    def __init__(self, nrows: int = 10, ncols: int = 10, obstacle_density: float = 0.2,
+                 n_goals: int = 1, n_traps: int = 2, goal_reward: float = 1, trap_reward: float = -1,
+                 placement: str = 'far', slip=(0.6, 0.2, 0.1, 0.1), n_doors: int = 0,
+                 wall_col: int = None, initial_state=(0, 0), seed=None,
+                 rng: np.random.Generator = None):
+        if placement not in ('far', 'random'):
+            raise ValueError(f"placement must be 'far' or 'random', got {placement!r}")
+        if len(slip) != 4 or min(slip) < 0 or not np.isclose(sum(slip), 1.0):
+            raise ValueError(f"slip must be 4 probabilities summing to 1, got {slip}")
+
+        self.rng = as_stream(rng)
+        self.nrows = nrows
+        self.ncols = ncols
+        self.initial_state = tuple(initial_state)
+        self.n_doors = n_doors
+        self.wall_col = ncols // 2 if wall_col is None else wall_col
+        self.seed = seed
+        (self.action_success_prob, self.clockwise_prob,
+         self.counterclockwise_prob, self.stay_prob) = slip
+
+        self.action_map = dict(zip(MOVEMENT_ACTIONS, [(-1, 0), (1, 0), (0, -1), (0, 1)]))
+        self.action_index = {a: i for i, a in enumerate(MOVEMENT_ACTIONS)}
+
+        self._generate(np.random.default_rng(seed), obstacle_density, n_goals, n_traps,
+                       goal_reward, trap_reward, placement)
+        self.reset()
+
+    def _generate(self, layout_rng, obstacle_density, n_goals, n_traps,
+                  goal_reward, trap_reward, placement):
+        nrows, ncols = self.nrows, self.ncols
+        n_cells = nrows * ncols
+        start = self.initial_state[0] * ncols + self.initial_state[1]
+
+        walls = layout_rng.random((nrows, ncols)) < obstacle_density
+        doors = np.zeros((nrows, ncols), dtype=bool)
+        if self.n_doors:
+            walls[:, self.wall_col] = True
+            door_rows = layout_rng.choice(nrows, size=min(self.n_doors, nrows), replace=False)
+            walls[door_rows, self.wall_col] = False
+            doors[door_rows, self.wall_col] = True
+            # Keep both sides of every door open
+            walls[door_rows, max(self.wall_col - 1, 0)] = False
+            walls[door_rows, min(self.wall_col + 1, ncols - 1)] = False
+        # Clear the start's neighbourhood so it is rarely sealed off
+        r0, c0 = self.initial_state
+        walls[max(r0 - 1, 0):r0 + 2, max(c0 - 1, 0):c0 + 2] = False
+        walls, doors = walls.ravel(), doors.ravel()
+
+        # Reachability with the doors locked and with them open
+        locked = move_table((walls | doors).reshape(nrows, ncols))
+        opened = move_table(walls.reshape(nrows, ncols))
+        distances = bfs_distances(opened, start)
+        free = np.flatnonzero(distances > 0)
+
+        key = -1
+        protected = [start]
+        if self.n_doors:
+            locked_distances = bfs_distances(locked, start)
+            before_door = np.flatnonzero(locked_distances > 0)
+            if before_door.size:
+                key = layout_rng.choice(before_door)
+                protected += shortest_path(locked, locked_distances, key)
+                behind_door = np.setdiff1d(free, before_door, assume_unique=True)
+                if behind_door.size:
+                    free = behind_door
+            free = free[free != key]
+
+        if placement == 'far':
+            goals = free[np.argsort(-distances[free], kind='stable')[:n_goals]]
+        else:
+            goals = layout_rng.choice(free, size=min(n_goals, free.size), replace=False)
+        for goal in goals.tolist():
+            protected += shortest_path(opened, distances, goal)
+        others = np.flatnonzero(distances > 0)
+        others = others[~np.isin(others, protected)]
+        traps = layout_rng.choice(others, size=min(n_traps, others.size), replace=False)
+
+        board = np.full(n_cells, ' ', dtype=object)
+        board[walls] = '#'
+        board[doors] = 'D'
+        board[goals] = goal_reward
+        board[traps] = trap_reward
+        if key >= 0:
+            board[key] = 'K'
+        board[start] = 'S'
+        self.board = board.reshape(nrows, ncols).tolist()
+
+        terminal = np.zeros(n_cells, dtype=bool)
+        terminal[goals] = True
+        terminal[traps] = True
+        rewards = np.zeros(n_cells)
+        rewards[goals] = goal_reward
+        rewards[traps] = trap_reward
+
+        self.key_cell = int(key)
+        self.n_layers = 2 if key >= 0 else 1
+        if self.n_layers == 1:
+            self.next_state = opened
+        else:
+            # Stepping on the key moves the agent to the has_key layer, where doors are open
+            self.next_state = np.concatenate([np.where(locked == key, key + n_cells, locked),
+                                              opened + n_cells])
+        self.walls = np.tile(walls, self.n_layers)
+        self.terminal = np.tile(terminal, self.n_layers)
+        self.rewards = np.tile(rewards, self.n_layers)
+
+        # Names used by the MDP model of the board-based envs (see grid_tables.TabularGrid)
+        self._next_cells = self.next_state
+        self._terminal = self.terminal
+        self._rewards = self.rewards
+        self._cell_states = None
+
+    @property
+    def cell_states(self) -> list:
+        """State of every flat cell, built on first use (it is a list of n_layers * N tuples)."""
+        if self._cell_states is None:
+            n_cells = self.nrows * self.ncols
+            layers, cells = np.divmod(np.arange(self.n_layers * n_cells), n_cells)
+            rows, cols = np.divmod(cells, self.ncols)
+            if self.n_layers == 1:
+                self._cell_states = list(zip(rows.tolist(), cols.tolist()))
+            else:
+                self._cell_states = list(zip(rows.tolist(), cols.tolist(), (layers == 1).tolist()))
+        return self._cell_states
+
+    def _cell(self, state) -> int:
+        cell = state[0] * self.ncols + state[1]
+        if self.n_layers > 1 and state[2]:
+            cell += self.nrows * self.ncols
+        return cell
+
+    def _state(self, cell: int):
+        layer, cell = divmod(cell, self.nrows * self.ncols)
+        r, c = divmod(cell, self.ncols)
+        return (r, c) if self.n_layers == 1 else (r, c, layer == 1)
+
+    def _get_clockwise_action(self, action):
+        return MOVEMENT_ACTIONS[CLOCKWISE[self.action_index[action]]]
+
+    def _get_counterclockwise_action(self, action):
+        return MOVEMENT_ACTIONS[COUNTERCLOCKWISE[self.action_index[action]]]
+
+    def _calculate_new_state(self, r, c, action, has_key=False):
+        a = self.action_index.get(action)
+        state = (r, c) if self.n_layers == 1 else (r, c, has_key)
+        if a is None:
+            return state
+        return self._state(self.next_state.item(self._cell(state), a))
+
+    def get_current_state(self):
+        return self.current_state
+
+    def get_possible_actions(self, state):
+        if self.terminal.item(self._cell(state)):
+            return ['exit']
+        return ['up', 'down', 'left', 'right']
+
+    def do_action(self, action):
+        cell = self._cell(self.current_state)
+
+        if self.terminal.item(cell):
+            if action == 'exit':
+                return self.rewards.item(cell), self.current_state
+            return 0, self.current_state
+
+        a = self.action_index[action]
+        rand = self.rng.random()
+        if rand < self.action_success_prob:
+            new_cell = self.next_state.item(cell, a)
+        elif rand < self.action_success_prob + self.clockwise_prob:
+            new_cell = self.next_state.item(cell, CLOCKWISE[a])
+        elif rand < self.action_success_prob + self.clockwise_prob + self.counterclockwise_prob:
+            new_cell = self.next_state.item(cell, COUNTERCLOCKWISE[a])
+        else:
+            new_cell = cell  # stay
+
+        self.current_state = self._state(new_cell)
+        return self.rewards.item(new_cell), self.current_state
+
+    def reset(self):
+        self.current_state = self.initial_state if self.n_layers == 1 else self.initial_state + (False,)
+
+    def is_terminal(self):
+        return self.terminal.item(self._cell(self.current_state))
+
+    def get_states(self):
+        states = self.cell_states
+        return [states[cell] for cell in np.flatnonzero(~self.walls).tolist()]
+
+    def get_reward(self, action, state, new_state):
+        return self.rewards.item(self._cell(new_state))
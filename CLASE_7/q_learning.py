@@ -1,6 +1,10 @@
 import numpy as np
-import json
 from loguru import logger
+from q_table import QTable
+from eligibility_traces import EligibilityTraces
+from replay import TabularModel
+from random_stream import as_stream
+from profiling import Profiler, profile_session
 
 
 class QLearning:
@@ -10,39 +14,46 @@ class QLearning:
     Updates Q-values using: Q(s,a) <- (1-alpha)*Q(s,a) + alpha*[R + gamma*max_a' Q(s',a')]
     The key difference from SARSA: uses max over next actions (off-policy)
     instead of the action actually taken.
+
+    With lam > 0 it runs Watkins Q(lambda): eligibility traces spread each TD
+    error over the recent greedy steps and are cut after an exploratory action.
+
+    Each real transition can also be reused:
+    - replay (a ReplayBuffer or PrioritizedReplayBuffer): after every step a
+      batch of replay_batch stored transitions is replayed.
+    - planning_steps > 0 (Dyna-Q): a tabular model of the observed transitions
+      is learned and planning_steps simulated updates follow every real step.
     """
 
     def __init__(self, env, alpha: float = 0.81, gamma: float = 0.96,
-                 epsilon: float = 0.9, num_episodes: int = 1000):
+                 epsilon: float = 0.9, num_episodes: int = 1000,
+                 lam: float = 0.0, trace_cutoff: float = 1e-3,
+                 replay=None, replay_batch: int = 32, planning_steps: int = 0,
+                 rng: np.random.Generator = None):
         self.env = env
+        self.rng = as_stream(rng)
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
         self.num_episodes = num_episodes
+        self.lam = lam
 
         # Q-table: memory of the agent
-        self.Q = {}
-        for state in env.get_states():
-            for action in env.get_possible_actions(state):
-                self.Q[(state, action)] = 0.0
+        self.Q = QTable.from_env(env)
+        self.traces = None
+        if lam > 0:
+            self.traces = EligibilityTraces(self.Q.table.size, gamma * lam, cutoff=trace_cutoff)
+
+        self.replay = replay
+        self.replay_batch = replay_batch
+        self.planning_steps = planning_steps
+        self.model = None
+        if planning_steps > 0:
+            self.model = TabularModel(*self.Q.table.shape, rng=self.rng)
 
     def choose_action(self, state):
-        """Epsilon-greedy action selection."""
-        actions = self.env.get_possible_actions(state)
-
-        if np.random.random() < self.epsilon:
-            # Exploit: best action
-            best_action = None
-            best_value = float('-inf')
-            for action in actions:
-                q_val = self.Q.get((state, action), 0.0)
-                if q_val > best_value:
-                    best_value = q_val
-                    best_action = action
-            return best_action
-        else:
-            # Explore: random action
-            return np.random.choice(actions)
+        """Epsilon-greedy action selection (epsilon is the probability of exploiting)."""
+        return self.Q.epsilon_greedy(state, 1 - self.epsilon, self.rng)
 
     def step(self, action):
         """
@@ -58,87 +69,131 @@ class QLearning:
         """Calculate the reward for a transition."""
         return self.env.get_reward(action, state, new_state)
 
-    def run(self):
+    def run_episode(self, max_steps: int = 1000):
         """
-        Execute the Q-Learning training loop.
-        Returns rewards history.
+        Run one Q-Learning episode.
+        Returns (total_reward, steps).
         """
-        rewards_history = []
-
-        for episode in range(self.num_episodes):
-            self.env.reset()
-            state = self.env.get_current_state()
-            total_reward = 0
-            steps = 0
+        self.env.reset()
+        if self.traces is not None:
+            self.traces.reset()
+        state = self.env.get_current_state()
+        total_reward = 0
+        steps = 0
 
-            while not self.env.is_terminal() and steps < 1000:
-                # Choose action
-                action = self.choose_action(state)
+        while not self.env.is_terminal() and steps < max_steps:
+            # Choose action
+            action = self.choose_action(state)
 
-                # Execute step
-                reward, done, new_state = self.step(action)
-                total_reward += reward
+            # Execute step
+            reward, done, new_state = self.step(action)
+            total_reward += reward
+
+            # Q-Learning update: use max Q(s', a') (off-policy)
+            q = self.Q.table
+            s, a = self.Q.state_index[state], self.Q.action_index[action]
+            s_next = self.Q.state_index[new_state]
+            max_q_next = q[s_next].max()
+
+            if self.traces is None:
+                q[s, a] = (1 - self.alpha) * q[s, a] + \
+                          self.alpha * (reward + self.gamma * max_q_next)
+            else:
+                # Watkins: an exploratory action ends the greedy trajectory the traces follow
+                if q[s, a] < q[s].max():
+                    self.traces.reset()
+                delta = reward + self.gamma * max_q_next - q[s, a]
+                self.traces.visit(s * q.shape[1] + a)
+                self.traces.update(q.reshape(-1), self.alpha * delta)
+
+            if self.replay is not None:
+                self.replay.add(s, a, reward, s_next, done)
+                if len(self.replay) >= self.replay_batch:
+                    indices, weights, batch = self.replay.sample(self.replay_batch)
+                    self.replay.update_priorities(indices, self._batch_update(*batch, weights))
+
+            if self.model is not None:
+                self.model.update(s, a, reward, s_next, done)
+                self._batch_update(*self.model.sample(self.planning_steps))
+
+            state = new_state
+            steps += 1
 
-                # Q-Learning update: use max Q(s', a') (off-policy)
-                actions_next = self.env.get_possible_actions(new_state)
-                max_q_next = max(
-                    [self.Q.get((new_state, a), 0.0) for a in actions_next],
-                    default=0.0
-                )
+        return total_reward, steps
 
-                old_q = self.Q.get((state, action), 0.0)
-                self.Q[(state, action)] = (1 - self.alpha) * old_q + \
-                                           self.alpha * (reward + self.gamma * max_q_next)
+    def run(self, profiler: Profiler = None):
+        """
+        Execute the Q-Learning training loop.
+        Returns rewards history.
 
-                state = new_state
-                steps += 1
+        With a Profiler, time is split into env.step (step), choose_action,
+        update (the rest of run_episode, replay and planning batches) and
+        bookkeeping (see profiling.py).
+        """
+        rewards_history = []
+        hooks = [(self, 'step', 'env.step'), (self, 'choose_action', 'choose_action'),
+                 (self, 'run_episode', 'update'), (self, '_batch_update', 'update')]
 
-            rewards_history.append(total_reward)
+        with profile_session(profiler, 'QLearning', hooks):
+            for episode in range(self.num_episodes):
+                total_reward, steps = self.run_episode()
+                rewards_history.append(total_reward)
+                if profiler is not None:
+                    profiler.episode(steps)
 
-            if (episode + 1) % 100 == 0:
-                avg_reward = np.mean(rewards_history[-100:])
-                logger.info(f"Episode {episode + 1}/{self.num_episodes} - "
-                           f"Avg Reward (last 100): {avg_reward:.1f} - Steps: {steps}")
+                if (episode + 1) % 100 == 0:
+                    avg_reward = np.mean(rewards_history[-100:])
+                    logger.info(f"Episode {episode + 1}/{self.num_episodes} - "
+                               f"Avg Reward (last 100): {avg_reward:.1f} - Steps: {steps}")
 
         return rewards_history
 
+    def _batch_update(self, states, actions, rewards, next_states, dones, weights=None):
+        """
+        Q-learning update over a batch of replayed or simulated transitions.
+        Returns the TD errors (used as priorities by prioritized replay).
+        """
+        q = self.Q.table
+        targets = rewards + self.gamma * np.where(dones, 0.0, q[next_states].max(axis=1))
+        td_errors = targets - q[states, actions]
+        steps = td_errors if weights is None else weights * td_errors
+
+        # A pair drawn several times moves by its mean error instead of stacking updates
+        cells, inverse, counts = np.unique(states * q.shape[1] + actions,
+                                           return_inverse=True, return_counts=True)
+        mean_steps = np.bincount(inverse, weights=steps, minlength=len(cells)) / counts
+        q.reshape(-1)[cells] += self.alpha * mean_steps
+        return td_errors
+
     def get_policy(self):
         """Extract the greedy policy from the Q-table."""
-        policy = {}
-        for state in self.env.get_states():
-            actions = self.env.get_possible_actions(state)
-            best_action = None
-            best_value = float('-inf')
-            for action in actions:
-                q_val = self.Q.get((state, action), 0.0)
-                if q_val > best_value:
-                    best_value = q_val
-                    best_action = action
-            policy[state] = best_action
-        return policy
+        return self.Q.greedy_policy()
 
     def save_q_table(self, filepath: str):
-        """Save the Q-table to a JSON file."""
-        serializable = {}
-        for (state, action), value in self.Q.items():
-            key = f"{state}|{action}"
-            serializable[key] = value
-        with open(filepath, 'w') as f:
-            json.dump(serializable, f, indent=2)
+        """Save the Q-table as a binary checkpoint, with the hyperparameters in its header."""
+        self.Q.save(filepath, metadata={
+            'env': type(self.env).__name__,
+            'alpha': self.alpha,
+            'gamma': self.gamma,
+            'epsilon': self.epsilon,
+            'num_episodes': self.num_episodes,
+        })
         logger.info(f"Q-table saved to {filepath}")
 
     def load_q_table(self, filepath: str):
-        """Load the Q-table from a JSON file."""
-        with open(filepath, 'r') as f:
-            serializable = json.load(f)
-        self.Q = {}
-        for key, value in serializable.items():
-            parts = key.split('|')
-            state_str = parts[0]
-            action = parts[1]
-            # Parse state tuple
-            state = eval(state_str)
-            self.Q[(state, action)] = value
+        """
+        Load a Q-table saved by save_q_table (memory-mapped copy-on-write, so
+        training can continue without touching the file). Legacy JSON Q-tables
+        are still accepted.
+        """
+        if filepath.endswith('.json'):
+            legacy = QTable.from_json(filepath)
+            self.Q = QTable.from_env(self.env)
+            rows = self.Q.rows(np.array(legacy.states))
+            cols = [self.Q.action_index[a] for a in legacy.actions]
+            self.Q.table[np.ix_(rows, cols)] = legacy.table
+        else:
+            self.Q = QTable.load(filepath, mode='c')
         logger.info(f"Q-table loaded from {filepath}")
 
     def print_path(self):
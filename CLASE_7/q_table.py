@@ -0,0 +1,317 @@
+import ast
+import json
+import numpy as np
+from action_selection import epsilon_greedy, epsilon_greedy_rows
+
+# Binary checkpoint: MAGIC | uint32 header length | JSON header | row codes | values,
+# with both array blocks aligned so they can be memory-mapped in place.
+MAGIC = b'QTABLE\x00\x00'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class QTable:
+    """
+    Q(s, a) stored in one dense (n_states, n_actions) array.
+
+    States are tuples such as (r, c) or (r, c, has_ball, has_key, door_open, kr, kc).
+    Each component is mapped to a digit and the state to a mixed-radix code,
+    which `code_to_row` turns into a row of the table, so arrays of states can
+    be indexed without Python loops. Single states go through `state_index`.
+
+    Dict-style access (Q[(state, action)], Q.get, Q.items) is kept as a view
+    over the array, so existing code using the dict Q-table keeps working.
+
+    When states have different action sets (e.g. only 'exit' in terminal
+    states), the columns are the union of them and `allowed` marks each
+    state's own actions. The other cells hold -inf, so max/argmax over a row
+    (in here or in the agents) only see the state's actions, and exploration
+    only draws among them.
+
+    save/load use a versioned binary checkpoint whose value block is opened
+    with np.memmap, so large tables load without copying and can be shared
+    read-only between processes.
+    """
+
+    def __init__(self, states, actions, dtype=np.float64):
+        states = list(states)
+        self._init_encoding([sorted(set(column)) for column in zip(*states)], actions)
+        self._init_rows(self.encode(np.array(states)), states)
+        self.table = np.zeros((len(states), len(self.actions)), dtype=dtype)
+        self.allowed = None
+        self._allowed_cols = None
+
+    def _init_encoding(self, levels, actions):
+        # Mixed-radix encoding over the tuple components
+        self.actions = list(actions)
+        self.action_index = {a: i for i, a in enumerate(self.actions)}
+        self.level_values = [list(values) for values in levels]
+        self.levels = [np.array(values) for values in levels]
+        radices = [len(values) for values in levels]
+        self.strides = np.ones(len(radices), dtype=np.int64)
+        for k in range(len(radices) - 2, -1, -1):
+            self.strides[k] = self.strides[k + 1] * radices[k + 1]
+        self.n_codes = int(np.prod(radices))
+
+    def _init_rows(self, codes, states=None):
+        self.codes = codes
+        self.code_to_row = np.full(self.n_codes, -1, dtype=np.int64)
+        self.code_to_row[codes] = np.arange(len(codes))
+        # State tuples and their dict index are only built when first needed
+        self._states = states
+        self._state_index = None
+
+    @property
+    def states(self):
+        if self._states is None:
+            self._states = self.decode(self.codes)
+        return self._states
+
+    @property
+    def state_index(self):
+        if self._state_index is None:
+            self._state_index = {s: i for i, s in enumerate(self.states)}
+        return self._state_index
+
+    @classmethod
+    def from_env(cls, env, dtype=np.float64):
+        """Q-table over all the env's states; columns are the union of their actions, in first-seen order."""
+        states = env.get_states()
+        state_actions = [env.get_possible_actions(state) for state in states]
+        actions = list(dict.fromkeys(a for possible in state_actions for a in possible))
+        q = cls(states, actions, dtype=dtype)
+        allowed = np.zeros(q.table.shape, dtype=bool)
+        for row, possible in enumerate(state_actions):
+            allowed[row, [q.action_index[a] for a in possible]] = True
+        q.set_allowed(allowed)
+        return q
+
+    def set_allowed(self, allowed: np.ndarray):
+        """Restrict each state to the actions marked in an (n_states, n_actions) mask; the rest become -inf."""
+        allowed = np.asarray(allowed, dtype=bool)
+        if allowed.all():
+            self.allowed = self._allowed_cols = None
+            return
+        if not allowed.any(axis=1).all():
+            raise ValueError("Every state needs at least one allowed action")
+        self.allowed = allowed
+        self._allowed_cols = [np.flatnonzero(row) for row in allowed]
+        self.table[~allowed] = -np.inf
+
+    def encode(self, states: np.ndarray) -> np.ndarray:
+        """Mixed-radix code of every row of an (N, k) array of states."""
+        states = np.asarray(states)
+        codes = np.zeros(len(states), dtype=np.int64)
+        for k, levels in enumerate(self.levels):
+            column = states[:, k]
+            digits = np.searchsorted(levels, column)
+            # searchsorted gives an insertion point for values it does not hold
+            known = digits < len(levels)
+            known[known] = levels[digits[known]] == column[known]
+            if not known.all():
+                raise ValueError(f"Unknown value {column[~known][0]} for state component {k}")
+            codes += digits * self.strides[k]
+        return codes
+
+    def decode(self, codes: np.ndarray) -> list:
+        """State tuples of an array of mixed-radix codes."""
+        codes = np.asarray(codes, dtype=np.int64)
+        columns = []
+        for k, values in enumerate(self.level_values):
+            digits = (codes // self.strides[k]) % len(values)
+            columns.append([values[d] for d in digits.tolist()])
+        return list(zip(*columns))
+
+    def rows(self, states: np.ndarray) -> np.ndarray:
+        """Table rows of an (N, k) array of states; ValueError for a state not in the table."""
+        codes = self.encode(states)
+        rows = self.code_to_row[codes]
+        if (rows < 0).any():
+            raise ValueError(f"State not in the Q-table: {self.decode(codes[rows < 0][:1])[0]}")
+        return rows
+
+    # Dict-style view
+
+    def __getitem__(self, key):
+        state, action = key
+        return float(self.table[self.state_index[state], self.action_index[action]])
+
+    def __setitem__(self, key, value):
+        state, action = key
+        self.table[self.state_index[state], self.action_index[action]] = value
+
+    def __contains__(self, key):
+        state, action = key
+        if state not in self.state_index or action not in self.action_index:
+            return False
+        return self.allowed is None or bool(self.allowed[self.state_index[state], self.action_index[action]])
+
+    def __len__(self):
+        return self.table.size if self.allowed is None else int(self.allowed.sum())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return [key for key, _ in self.items()]
+
+    def items(self):
+        allowed = self.allowed.tolist() if self.allowed is not None else None
+        return [((s, a), v) for i, (s, row) in enumerate(zip(self.states, self.table.tolist()))
+                for j, (a, v) in enumerate(zip(self.actions, row))
+                if allowed is None or allowed[i][j]]
+
+    # Greedy / exploratory selection
+
+    def max_value(self, state) -> float:
+        return float(self.table[self.state_index[state]].max())
+
+    def greedy_action(self, state):
+        """Best action of a state; ties go to the first action, so printed policies are stable."""
+        return self.actions[int(np.argmax(self.table[self.state_index[state]]))]
+
+    def greedy_actions(self, rows: np.ndarray) -> np.ndarray:
+        """Vectorized argmax: best action index for every row."""
+        return np.argmax(self.table[rows], axis=1)
+
+    def greedy_policy(self) -> dict:
+        best = np.argmax(self.table, axis=1)
+        return {s: self.actions[a] for s, a in zip(self.states, best.tolist())}
+
+    def epsilon_greedy(self, state, epsilon: float, rng=None):
+        """Random action with probability epsilon, a best action otherwise (ties broken at random)."""
+        rng = rng if rng is not None else np.random
+        row = self.state_index[state]
+        if self.allowed is None:
+            return self.actions[epsilon_greedy(self.table[row], epsilon, rng)]
+        cols = self._allowed_cols[row]
+        return self.actions[cols[epsilon_greedy(self.table[row, cols], epsilon, rng)]]
+
+    def epsilon_greedy_rows(self, rows: np.ndarray, epsilon: float, rng=None) -> np.ndarray:
+        """Vectorized epsilon-greedy: one action index per row, ties broken at random."""
+        rng = rng if rng is not None else np.random
+        actions = epsilon_greedy_rows(self.table[rows], epsilon, rng)
+        if self.allowed is not None:
+            # Greedy picks are allowed (the rest is -inf); random picks of another
+            # action are redrawn among the row's own, which keeps them uniform
+            redraw = ~self.allowed[rows, actions]
+            if redraw.any():
+                allowed = self.allowed[np.asarray(rows)[redraw]]
+                k = (rng.random(len(allowed)) * allowed.sum(axis=1)).astype(np.int64)
+                actions[redraw] = np.argmax(np.cumsum(allowed, axis=1) > k[:, None], axis=1)
+        return actions
+
+    # Checkpoints
+
+    def save(self, filepath: str, metadata: dict = None):
+        """Write a binary checkpoint; metadata (e.g. hyperparameters) goes into the header."""
+        table = np.ascontiguousarray(self.table)
+        header = {
+            'version': FORMAT_VERSION,
+            'levels': self.level_values,
+            'actions': self.actions,
+            'n_states': int(table.shape[0]),
+            'dtype': table.dtype.str,
+            'metadata': metadata or {},
+            'codes_offset': 0,
+            'values_offset': 0,
+        }
+
+        # Offsets are part of the header, so re-encode until its length settles
+        while True:
+            header_bytes = json.dumps(header).encode('utf-8')
+            codes_offset = _aligned(len(MAGIC) + 4 + len(header_bytes))
+            values_offset = _aligned(codes_offset + self.codes.nbytes)
+            if header['codes_offset'] == codes_offset and header['values_offset'] == values_offset:
+                break
+            header['codes_offset'] = codes_offset
+            header['values_offset'] = values_offset
+
+        with open(filepath, 'wb') as f:
+            f.write(MAGIC)
+            f.write(np.uint32(len(header_bytes)).tobytes())
+            f.write(header_bytes)
+            f.seek(codes_offset)
+            f.write(self.codes.astype('<i8').tobytes())
+            f.seek(values_offset)
+            f.write(table.tobytes())
+
+    @classmethod
+    def load(cls, filepath: str, mode: str = 'r'):
+        """
+        Open a binary checkpoint without copying the values.
+
+        mode is passed to np.memmap: 'r' read-only (shareable between processes),
+        'c' copy-on-write for further training, 'r+' to update the file in place.
+        Returns the QTable; the header metadata is available as `.metadata`.
+        """
+        with open(filepath, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{filepath} is not a Q-table checkpoint")
+            header_length = int(np.frombuffer(f.read(4), dtype=np.uint32)[0])
+            header = json.loads(f.read(header_length).decode('utf-8'))
+        if header['version'] > FORMAT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {header['version']}")
+
+        n_states = header['n_states']
+        q = cls.__new__(cls)
+        q._init_encoding(header['levels'], header['actions'])
+        codes = np.memmap(filepath, dtype='<i8', mode='r', offset=header['codes_offset'],
+                          shape=(n_states,))
+        q._init_rows(np.asarray(codes))
+        q.table = np.memmap(filepath, dtype=np.dtype(header['dtype']), mode=mode,
+                            offset=header['values_offset'], shape=(n_states, len(q.actions)))
+        # Masked-out actions are saved as -inf
+        q.allowed = q._allowed_cols = None
+        disallowed = np.isneginf(q.table)
+        if disallowed.any():
+            q.allowed = ~disallowed
+            q._allowed_cols = [np.flatnonzero(row) for row in q.allowed]
+        q.metadata = header['metadata']
+        return q
+
+    @classmethod
+    def from_json(cls, filepath: str):
+        """Read a legacy '{state}|{action}' JSON Q-table (parsed with literal_eval, not eval)."""
+        with open(filepath, 'r') as f:
+            serializable = json.load(f)
+
+        entries = []
+        states, actions = {}, {}
+        for key, value in serializable.items():
+            state_str, action = key.rsplit('|', 1)
+            state = ast.literal_eval(state_str)
+            states.setdefault(state, len(states))
+            actions.setdefault(action, len(actions))
+            entries.append((states[state], actions[action], value))
+
+        q = cls(list(states), list(actions))
+        rows, cols, values = zip(*entries)
+        allowed = np.zeros(q.table.shape, dtype=bool)
+        allowed[list(rows), list(cols)] = True
+        q.set_allowed(allowed)
+        q.table[list(rows), list(cols)] = values
+        return q
+
+
+def convert_json_checkpoint(json_path: str, output_path: str, metadata: dict = None):
+    """Convert a legacy JSON Q-table into the binary checkpoint format."""
+    q = QTable.from_json(json_path)
+    q.save(output_path, metadata=metadata)
+    return q
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python q_table.py <q_table.json> <output checkpoint>")
+        sys.exit(1)
+    convert_json_checkpoint(sys.argv[1], sys.argv[2])
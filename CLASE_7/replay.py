@@ -0,0 +1,149 @@
+import numpy as np
+from random_stream import as_stream
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of transitions in preallocated NumPy arrays.
+
+    States are stored as Q-table rows and actions as column indices, so a
+    sampled batch can be applied to the Q-table with fancy indexing. Once
+    `capacity` transitions are stored the oldest ones are overwritten.
+    """
+
+    def __init__(self, capacity: int = 10000, rng: np.random.Generator = None):
+        self.capacity = capacity
+        self.rng = as_stream(rng)
+
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.dones = np.zeros(capacity, dtype=bool)
+
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state: int, action: int, reward: float, next_state: int, done: bool):
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return i
+
+    def _batch(self, indices):
+        return (self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices])
+
+    def sample(self, batch_size: int):
+        """
+        Uniform batch. Returns (indices, weights, (states, actions, rewards, next_states, dones));
+        weights are all ones, to match the prioritized buffer.
+        """
+        indices = self.rng.integers(self.size, size=batch_size)
+        return indices, np.ones(batch_size), self._batch(indices)
+
+    def update_priorities(self, indices, td_errors):
+        pass
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Proportional prioritized replay: P(i) ~ (|delta_i| + eps)^alpha.
+
+    Priorities live in an array-backed sum tree (leaves at [n_leaves, 2 * n_leaves)),
+    so sampling and priority updates of a whole batch cost O(batch * log capacity)
+    NumPy work. Importance-sampling weights use exponent beta, normalized by their max.
+    """
+
+    def __init__(self, capacity: int = 10000, alpha: float = 0.6, beta: float = 0.4,
+                 eps: float = 1e-3, rng: np.random.Generator = None):
+        super().__init__(capacity, rng)
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+
+        self.depth = max(capacity - 1, 0).bit_length()
+        self.n_leaves = 1 << self.depth
+        self.tree = np.zeros(2 * self.n_leaves)
+        self.max_priority = 1.0
+
+    def add(self, state, action, reward, next_state, done):
+        i = super().add(state, action, reward, next_state, done)
+        self._set_priorities(np.array([i]), np.array([self.max_priority]))
+        return i
+
+    def _set_priorities(self, indices, priorities):
+        # Last write wins for repeated indices; the change is then added to every ancestor at once
+        indices, last = np.unique(indices[::-1], return_index=True)
+        leaves = indices + self.n_leaves
+        deltas = priorities[::-1][last] - self.tree[leaves]
+        self.tree[leaves] += deltas
+        ancestors = leaves[:, None] >> np.arange(1, self.depth + 1)
+        np.add.at(self.tree, ancestors.ravel(), np.repeat(deltas, self.depth))
+
+    def sample(self, batch_size):
+        """Stratified proportional batch, same return layout as ReplayBuffer.sample."""
+        total = self.tree[1]
+        targets = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+
+        nodes = np.ones(batch_size, dtype=np.int64)
+        for _ in range(self.depth):
+            nodes += nodes  # left child
+            left_sums = self.tree[nodes]
+            go_right = targets > left_sums
+            targets -= left_sums * go_right
+            nodes += go_right
+        indices = np.minimum(nodes - self.n_leaves, self.size - 1)
+
+        probs = self.tree[indices + self.n_leaves] / total
+        weights = (self.size * probs) ** -self.beta
+        return indices, weights / weights.max(), self._batch(indices)
+
+    def update_priorities(self, indices, td_errors):
+        priorities = (np.abs(td_errors) + self.eps) ** self.alpha
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self._set_priorities(indices, priorities)
+
+
+class TabularModel:
+    """
+    Learned model for Dyna-Q: last observed (reward, next state, done) per (state, action).
+
+    The pairs seen so far are kept in an array so planning can sample them uniformly.
+    """
+
+    def __init__(self, n_states: int, n_actions: int, rng: np.random.Generator = None):
+        self.n_actions = n_actions
+        self.rng = as_stream(rng)
+
+        n_pairs = n_states * n_actions
+        self.rewards = np.zeros(n_pairs)
+        self.next_states = np.zeros(n_pairs, dtype=np.int64)
+        self.dones = np.zeros(n_pairs, dtype=bool)
+        self.seen = np.zeros(n_pairs, dtype=bool)
+        self.observed = np.zeros(n_pairs, dtype=np.int64)
+        self.n_observed = 0
+
+    def update(self, state: int, action: int, reward: float, next_state: int, done: bool):
+        pair = state * self.n_actions + action
+        self.rewards[pair] = reward
+        self.next_states[pair] = next_state
+        self.dones[pair] = done
+        if not self.seen[pair]:
+            self.seen[pair] = True
+            self.observed[self.n_observed] = pair
+            self.n_observed += 1
+
+    def sample(self, n: int):
+        """n simulated transitions (states, actions, rewards, next_states, dones) from seen pairs."""
+        pairs = self.observed[self.rng.integers(self.n_observed, size=n)]
+        states, actions = np.divmod(pairs, self.n_actions)
+        return states, actions, self.rewards[pairs], self.next_states[pairs], self.dones[pairs]
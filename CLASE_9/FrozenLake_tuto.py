@@ -40,6 +40,9 @@ from tqdm import tqdm
 import gymnasium as gym
 from gymnasium.envs.toy_text.frozen_lake import generate_random_map
 
+from frozenlake_agents import EpsilonGreedy, Qlearning
+from random_stream import RandomStream
+
 
 sns.set_theme()
 
@@ -65,6 +68,8 @@ class Params(NamedTuple):
     state_size: int  # Number of possible states
     proba_frozen: float  # Probability that a tile is frozen
     savefig_folder: Path  # Root folder where plots are saved
+    vectorized: bool  # If true the runs are played side by side as arrays (run_env_vectorized)
+    trajectory_folder: Path  # If set, every visited state and action is kept in memory-mapped files there
 
 
 params = Params(
@@ -80,11 +85,13 @@ params = Params(
     state_size=None,
     proba_frozen=0.9,
     savefig_folder=Path("../../_static/img/tutorials/"),
+    vectorized=True,
+    trajectory_folder=None,
 )
 params
 
-# Set the seed
-rng = np.random.default_rng(params.seed)
+# Set the seed (per-step draws are served from pre-drawn blocks)
+rng = RandomStream(np.random.default_rng(params.seed))
 
 # Create the figure folder if it doesn't exists
 params.savefig_folder.mkdir(parents=True, exist_ok=True)
@@ -122,52 +129,156 @@ print(f"Action size: {params.action_size}")
 print(f"State size: {params.state_size}")
 
 
-class Qlearning:
-    def __init__(self, learning_rate, gamma, state_size, action_size):
-        self.state_size = state_size
-        self.action_size = action_size
-        self.learning_rate = learning_rate
-        self.gamma = gamma
-        self.reset_qtable()
-
-    def update(self, state, action, reward, new_state):
-        """Update Q(s,a):= Q(s,a) + lr [R(s,a) + gamma * max Q(s',a') - Q(s,a)]"""
-        delta = (
-            reward
-            + self.gamma * np.max(self.qtable[new_state, :])
-            - self.qtable[state, action]
-        )
-        q_update = self.qtable[state, action] + self.learning_rate * delta
-        return q_update
-
-    def reset_qtable(self):
-        """Reset the Q-table."""
-        self.qtable = np.zeros((self.state_size, self.action_size))
-
-
-class EpsilonGreedy:
-    def __init__(self, epsilon):
-        self.epsilon = epsilon
-
-    def choose_action(self, action_space, state, qtable):
-        """Choose an action `a` in the current world state (s)."""
-        # First we randomize a number
-        explor_exploit_tradeoff = rng.uniform(0, 1)
+# %%
+# The learner and the explorer live in ``frozenlake_agents.py``: ``Qlearning``
+# keeps the Q-table and applies the update
+# :math:`Q(s,a) := Q(s,a) + lr [R(s,a) + \gamma \max Q(s',a') - Q(s,a)]`,
+# and ``EpsilonGreedy`` picks a random action with probability
+# :math:`\epsilon` and a best action otherwise, breaking ties at random.
+#
 
-        # Exploration
-        if explor_exploit_tradeoff < self.epsilon:
-            action = action_space.sample()
 
-        # Exploitation (taking the biggest Q-value for this state)
-        else:
-            # Break ties randomly
-            # If all actions are the same for this state we choose a random one
-            # (otherwise `np.argmax()` would always take the first one)
-            if np.all(qtable[state, :]) == qtable[state, 0]:
-                action = action_space.sample()
+# %%
+# Logging the trajectories
+# ~~~~~~~~~~~~~~~~~~~~~~~~
+#
+# To check what the agent does, we'll log every state it visits and every
+# action it takes. Over ``n_runs`` runs of ``total_episodes`` episodes this
+# quickly reaches millions of steps, so instead of Python lists the steps
+# go into preallocated integer arrays, and we keep running counts of the
+# states and actions, which is all the plots need.
+#
+
+
+class TrajectoryRecorder:
+    """
+    Visited states and chosen actions stored as columns.
+
+    Steps are written into preallocated int8/int16 arrays that double in size
+    when full, or, with `path`, into memory-mapped files (`<path>.states` and
+    `<path>.actions`) that grow the same way. The columns are folded into
+    streaming histograms of the states and actions with one bincount per
+    block. With keep_steps=False only the counts are kept: the columns become
+    a fixed block buffer that is reused once counted, so memory stays flat
+    however many steps are recorded.
+    """
+
+    def __init__(self, n_states, n_actions, path=None, keep_steps=True, capacity=2**16):
+        self.state_counts = np.zeros(n_states, dtype=np.int64)
+        self.action_counts = np.zeros(n_actions, dtype=np.int64)
+        self.dtypes = {
+            "states": np.dtype(np.int8 if n_states <= 2**7 else np.int16),
+            "actions": np.dtype(np.int8),
+        }
+        self.path = path
+        self.keep_steps = keep_steps
+        self.n_steps = 0  # Steps recorded so far
+        self.size = 0  # Steps held in the columns
+        self.counted = 0  # Steps of the columns already in the counts
+        self.capacity = 0
+        self.columns = {}
+        self._resize(capacity)
+
+    def _filename(self, name):
+        return f"{self.path}.{name}"
+
+    def _resize(self, capacity):
+        for name, dtype in self.dtypes.items():
+            old = self.columns.get(name)
+            if self.path is None:
+                column = np.empty(capacity, dtype=dtype)
+                if old is not None:
+                    column[: self.size] = old[: self.size]
             else:
-                action = np.argmax(qtable[state, :])
-        return action
+                # The file already holds the steps written so far, it only gets longer
+                if old is not None:
+                    old.flush()
+                with open(self._filename(name), "r+b" if old is not None else "wb") as f:
+                    f.truncate(capacity * dtype.itemsize)
+                column = np.memmap(self._filename(name), dtype=dtype, mode="r+", shape=(capacity,))
+            self.columns[name] = column
+        # Plain ndarray views: slicing a np.memmap goes through Python-level hooks
+        self._states = self.columns["states"].view(np.ndarray)
+        self._actions = self.columns["actions"].view(np.ndarray)
+        self.capacity = capacity
+
+    def _fold(self):
+        """Add the steps not counted yet to the histograms."""
+        states = self._states[self.counted : self.size]
+        actions = self._actions[self.counted : self.size]
+        self.state_counts += np.bincount(states, minlength=len(self.state_counts))
+        self.action_counts += np.bincount(actions, minlength=len(self.action_counts))
+        self.counted = self.size
+
+    def _make_room(self, n_steps):
+        self._fold()
+        if not self.keep_steps:
+            self.size = self.counted = 0
+        if self.size + n_steps > self.capacity:
+            self._resize(max(2 * self.capacity, self.size + n_steps))
+
+    def append(self, state, action):
+        """Record one step."""
+        if self.size == self.capacity:
+            self._make_room(1)
+        self._states[self.size] = state
+        self._actions[self.size] = action
+        self.size += 1
+        self.n_steps += 1
+
+    def extend(self, states, actions):
+        """Record a batch of steps (one per run for the vectorized runs)."""
+        n_steps = len(states)
+        if self.size + n_steps > self.capacity:
+            self._make_room(n_steps)
+        self._states[self.size : self.size + n_steps] = states
+        self._actions[self.size : self.size + n_steps] = actions
+        self.size += n_steps
+        self.n_steps += n_steps
+
+    def histograms(self):
+        """(state_counts, action_counts) of every step recorded so far."""
+        self._fold()
+        return self.state_counts, self.action_counts
+
+    @property
+    def states(self):
+        if not self.keep_steps:
+            raise ValueError("Steps are not kept with keep_steps=False, use histograms()")
+        return self._states[: self.size]
+
+    @property
+    def actions(self):
+        if not self.keep_steps:
+            raise ValueError("Steps are not kept with keep_steps=False, use histograms()")
+        return self._actions[: self.size]
+
+    def close(self):
+        """Count the last steps and, when memory-mapped, cut the files down to them (read-only after)."""
+        self._fold()
+        if self.path is None:
+            return
+        size = self.size if self.keep_steps else 0
+        self.columns = {}
+        self._states = self._actions = None
+        for name, dtype in self.dtypes.items():
+            with open(self._filename(name), "r+b") as f:
+                f.truncate(size * dtype.itemsize)
+            self.columns[name] = (
+                np.memmap(self._filename(name), dtype=dtype, mode="r", shape=(size,))
+                if size
+                else np.empty(0, dtype=dtype)
+            )
+        self._states, self._actions = self.columns["states"], self.columns["actions"]
+
+
+def new_trajectory():
+    """Recorder of one map: only the counts, or every step under params.trajectory_folder."""
+    if params.trajectory_folder is None:
+        return TrajectoryRecorder(params.state_size, params.action_size, keep_steps=False)
+    params.trajectory_folder.mkdir(parents=True, exist_ok=True)
+    path = params.trajectory_folder / f"frozenlake_trajectory_{params.map_size}x{params.map_size}"
+    return TrajectoryRecorder(params.state_size, params.action_size, path=path)
 
 
 # %%
@@ -185,6 +296,7 @@ learner = Qlearning(
 )
 explorer = EpsilonGreedy(
     epsilon=params.epsilon,
+    rng=rng,
 )
 
 
@@ -200,8 +312,7 @@ def run_env():
     steps = np.zeros((params.total_episodes, params.n_runs))
     episodes = np.arange(params.total_episodes)
     qtables = np.zeros((params.n_runs, params.state_size, params.action_size))
-    all_states = []
-    all_actions = []
+    trajectory = new_trajectory()
 
     for run in range(params.n_runs):  # Run several times to account for stochasticity
         learner.reset_qtable()  # Reset the Q-table between runs
@@ -220,8 +331,7 @@ def run_env():
                 )
 
                 # Log all states and actions
-                all_states.append(state)
-                all_actions.append(action)
+                trajectory.append(state, action)
 
                 # Take the action (a) and observe the outcome state(s') and reward (r)
                 new_state, reward, terminated, truncated, info = env.step(action)
@@ -243,7 +353,158 @@ def run_env():
             steps[episode, run] = step
         qtables[run, :, :] = learner.qtable
 
-    return rewards, steps, episodes, qtables, all_states, all_actions
+    trajectory.close()
+    return rewards, steps, episodes, qtables, trajectory
+
+
+# %%
+# Running the runs side by side
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#
+# The runs are independent, so instead of playing them one after the
+# other we can play them all at once: the ``n_runs`` Q-tables live in one
+# ``(n_runs, state_size, action_size)`` array, and ``n_runs`` copies of
+# the environment are stepped together from its transition table
+# ``env.unwrapped.P``. The :math:`\epsilon`-greedy choice and the Q-learning
+# update then become a handful of array operations per step for all the
+# runs, instead of Python calls per run.
+#
+
+
+class VectorFrozenLake:
+    """
+    n_envs copies of a FrozenLake env stepped together from its transition table.
+
+    P[s][a] is a list of (probability, next_state, reward, terminated) outcomes
+    (3 when slippery, 1 otherwise); it is padded into (S * A, n_outcomes) arrays
+    and, when there is more than one outcome, one uniform draw per env picks it.
+    Episodes are truncated after the env's max_episode_steps, as gym.make's
+    TimeLimit does.
+    """
+
+    def __init__(self, env, n_envs, rng):
+        transitions = env.unwrapped.P
+        self.n_actions = env.action_space.n
+        n_pairs = env.observation_space.n * self.n_actions
+        n_outcomes = max(len(outcomes) for s in transitions for outcomes in transitions[s].values())
+        probs = np.zeros((n_pairs, n_outcomes))
+        self.next_state = np.zeros((n_pairs, n_outcomes), dtype=np.int64)
+        self.reward = np.zeros((n_pairs, n_outcomes))
+        self.terminated = np.zeros((n_pairs, n_outcomes), dtype=bool)
+        for s, actions in transitions.items():
+            for a, outcomes in actions.items():
+                for k, (prob, next_state, reward, terminated) in enumerate(outcomes):
+                    probs[s * self.n_actions + a, k] = prob
+                    self.next_state[s * self.n_actions + a, k] = next_state
+                    self.reward[s * self.n_actions + a, k] = reward
+                    self.terminated[s * self.n_actions + a, k] = terminated
+        self.cum_probs = probs.cumsum(axis=1)
+        self.initial_cum_probs = np.cumsum(env.unwrapped.initial_state_distrib)
+        self.max_episode_steps = env.spec.max_episode_steps if env.spec is not None else None
+        self.n_envs = n_envs
+        self.rng = rng
+        self.states = np.zeros(n_envs, dtype=np.int64)
+        self.elapsed_steps = np.zeros(n_envs, dtype=np.int64)
+
+    def reset(self, mask=None):
+        """Reset the envs selected by a boolean mask (all by default) and return their initial states."""
+        mask = np.ones(self.n_envs, dtype=bool) if mask is None else mask
+        draws = self.rng.random(np.count_nonzero(mask)) * self.initial_cum_probs[-1]
+        self.states[mask] = np.searchsorted(self.initial_cum_probs, draws, side="right")
+        self.elapsed_steps[mask] = 0
+        return self.states[mask]
+
+    def step(self, actions):
+        """Step every env; returns (new_states, rewards, terminated, truncated) arrays."""
+        pairs = self.states * self.n_actions + actions
+        if self.cum_probs.shape[1] == 1:
+            outcomes = 0
+        else:
+            cum_probs = self.cum_probs[pairs]
+            draws = self.rng.random(self.n_envs) * cum_probs[:, -1]
+            outcomes = (draws[:, None] >= cum_probs).sum(axis=1)
+        new_states = self.next_state[pairs, outcomes]
+        rewards = self.reward[pairs, outcomes]
+        terminated = self.terminated[pairs, outcomes]
+
+        self.states = new_states.copy()
+        self.elapsed_steps += 1
+        if self.max_episode_steps is None:
+            truncated = np.zeros_like(terminated)
+        else:
+            truncated = ~terminated & (self.elapsed_steps >= self.max_episode_steps)
+        return new_states, rewards, terminated, truncated
+
+
+# %%
+# Each run moves on to its next episode as soon as the current one ends
+# (like the autoreset of Gymnasium vector environments), so the loop below
+# runs once per step of the longest run rather than once per step of every
+# run. A run that has played all its episodes keeps stepping until the
+# others are done, but its Q-table is saved when it finishes and its steps
+# are neither logged nor counted. It returns the same arrays as ``run_env``.
+#
+
+
+def run_env_vectorized():
+    rewards = np.zeros((params.total_episodes, params.n_runs))
+    steps = np.zeros((params.total_episodes, params.n_runs))
+    episodes = np.arange(params.total_episodes)
+    qtables = np.zeros((params.n_runs, params.state_size, params.action_size))
+    trajectory = new_trajectory()
+
+    vec_env = VectorFrozenLake(env, params.n_runs, rng)
+    learning = np.zeros((params.n_runs, params.state_size, params.action_size))
+    runs = np.arange(params.n_runs)
+    episode = np.zeros(params.n_runs, dtype=np.int64)  # Current episode of every run
+    playing = np.ones(params.n_runs, dtype=bool)  # Runs that still have episodes to play
+    n_playing = params.n_runs
+    total_rewards = np.zeros(params.n_runs)
+    step = np.zeros(params.n_runs, dtype=np.int64)
+    states = vec_env.reset()
+
+    with tqdm(total=params.total_episodes * params.n_runs, desc="Episodes", leave=False) as progress:
+        while True:
+            actions = explorer.choose_actions(learning[runs, states])
+
+            # Log all states and actions
+            if n_playing == params.n_runs:
+                trajectory.extend(states, actions)
+            else:
+                trajectory.extend(states[playing], actions[playing])
+
+            new_states, reward, terminated, truncated = vec_env.step(actions)
+            learning[runs, states, actions] = learner.update_batch(
+                learning, runs, states, actions, reward, new_states
+            )
+            total_rewards += reward
+            step += 1
+            states = new_states
+
+            done = terminated | truncated
+            if not done.any():
+                continue
+
+            # Log the rewards and steps of the finished episodes and start the next ones
+            finished = runs[done & playing]
+            rewards[episode[finished], finished] = total_rewards[finished]
+            steps[episode[finished], finished] = step[finished]
+            episode[finished] += 1
+            progress.update(finished.size)
+
+            completed = finished[episode[finished] == params.total_episodes]
+            qtables[completed] = learning[completed]
+            playing[completed] = False
+            n_playing -= completed.size
+            if not n_playing:
+                break
+
+            total_rewards[done] = 0
+            step[done] = 0
+            states[done] = vec_env.reset(done)
+
+    trajectory.close()
+    return rewards, steps, episodes, qtables, trajectory
 
 
 # %%
@@ -347,14 +608,16 @@ def plot_q_values_map(qtable, env, map_size):
 #
 
 
-def plot_states_actions_distribution(states, actions, map_size):
-    """Plot the distributions of states and actions."""
+def plot_states_actions_distribution(state_counts, action_counts, map_size):
+    """Plot the distributions of states and actions from their counts."""
     labels = {"LEFT": 0, "DOWN": 1, "RIGHT": 2, "UP": 3}
 
     fig, ax = plt.subplots(nrows=1, ncols=2, figsize=(15, 5))
-    sns.histplot(data=states, ax=ax[0], kde=True)
+    sns.histplot(
+        x=np.arange(len(state_counts)), weights=state_counts, discrete=True, ax=ax[0], kde=True
+    )
     ax[0].set_title("States")
-    sns.histplot(data=actions, ax=ax[1])
+    sns.histplot(x=np.arange(len(action_counts)), weights=action_counts, discrete=True, ax=ax[1])
     ax[1].set_xticks(list(labels.values()), labels=labels.keys())
     ax[1].set_title("Actions")
     fig.tight_layout()
@@ -387,6 +650,7 @@ for map_size in map_sizes:
 
     params = params._replace(action_size=env.action_space.n)
     params = params._replace(state_size=env.observation_space.n)
+    params = params._replace(map_size=map_size)
     env.action_space.seed(
         params.seed
     )  # Set the seed to get reproducible results when sampling the action space
@@ -398,10 +662,13 @@ for map_size in map_sizes:
     )
     explorer = EpsilonGreedy(
         epsilon=params.epsilon,
+        rng=rng,
     )
 
     print(f"Map size: {map_size}x{map_size}")
-    rewards, steps, episodes, qtables, all_states, all_actions = run_env()
+    rewards, steps, episodes, qtables, trajectory = (
+        run_env_vectorized() if params.vectorized else run_env()
+    )
 
     # Save the results in dataframes
     res, st = postprocess(episodes, params, rewards, steps, map_size)
@@ -409,8 +676,9 @@ for map_size in map_sizes:
     st_all = pd.concat([st_all, st])
     qtable = qtables.mean(axis=0)  # Average the Q-table between runs
 
+    state_counts, action_counts = trajectory.histograms()
     plot_states_actions_distribution(
-        states=all_states, actions=all_actions, map_size=map_size
+        state_counts=state_counts, action_counts=action_counts, map_size=map_size
     )  # Sanity check
     plot_q_values_map(qtable, env, map_size)
 
@@ -0,0 +1,54 @@
+import numpy as np
+
+from action_selection import epsilon_greedy, epsilon_greedy_rows
+
+# Q-learning and epsilon-greedy exploration of the FrozenLake tutorial
+# (FrozenLake_tuto.py), in a module of their own so that the benchmarks and
+# other scripts can import them without running the tutorial.
+
+
+class Qlearning:
+    def __init__(self, learning_rate, gamma, state_size, action_size):
+        self.state_size = state_size
+        self.action_size = action_size
+        self.learning_rate = learning_rate
+        self.gamma = gamma
+        self.reset_qtable()
+
+    def update(self, state, action, reward, new_state):
+        """Update Q(s,a):= Q(s,a) + lr [R(s,a) + gamma * max Q(s',a') - Q(s,a)]"""
+        delta = (
+            reward
+            + self.gamma * np.max(self.qtable[new_state, :])
+            - self.qtable[state, action]
+        )
+        q_update = self.qtable[state, action] + self.learning_rate * delta
+        return q_update
+
+    def update_batch(self, qtables, runs, states, actions, rewards, new_states):
+        """`update` for several independent Q-tables at once: row i updates qtables[runs[i]]."""
+        q = qtables[runs, states, actions]
+        delta = rewards + self.gamma * qtables[runs, new_states].max(axis=1) - q
+        return q + self.learning_rate * delta
+
+    def reset_qtable(self):
+        """Reset the Q-table."""
+        self.qtable = np.zeros((self.state_size, self.action_size))
+
+
+class EpsilonGreedy:
+    def __init__(self, epsilon, rng):
+        self.epsilon = epsilon
+        self.rng = rng
+
+    def choose_action(self, action_space, state, qtable):
+        """Choose an action `a` in the current world state (s)."""
+        # With probability epsilon we explore (random action), otherwise we
+        # exploit by taking the biggest Q-value for this state. Ties are broken
+        # randomly, otherwise `np.argmax()` would always take the first of the
+        # best actions, e.g. on every state the agent hasn't learned about yet.
+        return epsilon_greedy(qtable[state, :], self.epsilon, self.rng)
+
+    def choose_actions(self, qvalues):
+        """`choose_action` for a batch of Q-value rows (one per run), ties broken at random."""
+        return epsilon_greedy_rows(qvalues, self.epsilon, self.rng)
@@ -0,0 +1,216 @@
+"""
+Benchmark cases: one function per algorithm, called as case(size, seed, episodes).
+
+Each case imports its algorithm from the class folder listed in CASES (the
+runner puts that folder first on sys.path, in a fresh process per case, since
+the folders reuse module names), builds a ProceduralGridWorld of size x size,
+runs the algorithm and returns raw counts:
+
+- build_time / wall_time: seconds spent constructing env + agent / running it
+- backups: Bellman or TD updates applied
+- steps: env.do_action calls (0 for the planners)
+- episodes, and convergence: sweeps/iterations for the planners, episodes for the learners
+"""
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def episodes_to_converge(curve, window: int = 50, tolerance: float = 0.2):
+    """
+    First episode at which the moving average of `curve` (episode lengths,
+    max |dV|, ...) comes within tolerance of its final level. None when the run
+    is too short to tell or the curve never moved (e.g. every episode hit max_steps).
+    """
+    curve = np.asarray(curve, dtype=np.float64)
+    if len(curve) < 2 * window:
+        return None
+    smoothed = np.convolve(curve, np.ones(window) / window, mode='valid')
+    final = smoothed[-1]
+    scale = abs(final) if final != 0 else np.abs(smoothed).max()
+    inside = np.abs(smoothed - final) <= tolerance * scale
+    if inside.all():
+        return None
+    return int(np.argmax(inside) + window)
+
+
+def _grid(size: int, seed: int):
+    from procedural_gridworld import ProceduralGridWorld
+    return ProceduralGridWorld(size, size, seed=seed, rng=np.random.default_rng(seed))
+
+
+def _count_steps(env) -> list:
+    """Wrap env.do_action with a counter; returns the one-element list it increments."""
+    counter = [0]
+    do_action = env.do_action
+
+    def counted(action):
+        counter[0] += 1
+        return do_action(action)
+
+    env.do_action = counted
+    return counter
+
+
+def value_iteration(size, seed, episodes):
+    from mdp import MDP
+    from value_iteration import ValueIteration
+
+    start = time.perf_counter()
+    agent = ValueIteration(MDP(_grid(size, seed)), discount=0.95, iterations=10000,
+                           vectorized=True, epsilon=1e-6)
+    build_time = time.perf_counter() - start
+    agent.run_value_iteration()
+    return {'build_time': build_time, 'wall_time': agent.wall_time, 'backups': agent.n_backups,
+            'steps': 0, 'episodes': 0, 'convergence': agent.n_iterations}
+
+
+def policy_iteration(size, seed, episodes):
+    from mdp import MDP
+    from policy_iteration import PolicyIteration
+
+    start = time.perf_counter()
+    agent = PolicyIteration(MDP(_grid(size, seed)), discount=0.95, iterations=1000, evaluation='exact')
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    agent.run_policy_iteration()
+    wall_time = time.perf_counter() - start
+    # One greedy improvement backup per state and iteration
+    return {'build_time': build_time, 'wall_time': wall_time,
+            'backups': agent.n_iterations * agent.compiled.n_states,
+            'steps': 0, 'episodes': 0, 'convergence': agent.n_iterations}
+
+
+def mcm(size, seed, episodes):
+    from mcm import MCM
+
+    start = time.perf_counter()
+    env = _grid(size, seed)
+    steps = _count_steps(env)
+    agent = MCM(env, discount=0.9, epsilon=0.3, rng=np.random.default_rng(seed))
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    n_episodes = agent.run(max_episodes=episodes, seed=seed)
+    wall_time = time.perf_counter() - start
+    converged = n_episodes < episodes
+    # First-visit MC: each (state, action) adds one return per episode it appears in,
+    # which is what the agent's visit counts sum up
+    backups = int(sum(agent.visit_counts.values()))
+    return {'build_time': build_time, 'wall_time': wall_time, 'backups': backups,
+            'steps': steps[0], 'episodes': n_episodes,
+            'convergence': n_episodes if converged else None}
+
+
+def td_learning(size, seed, episodes):
+    from grid_tables import MOVEMENT_ACTIONS
+    from procedural_gridworld import bfs_distances
+    from td_history import MaxDeltaHistory
+    from td_learning import TDLearning
+
+    start = time.perf_counter()
+    env = _grid(size, seed)
+    # Fixed policy to evaluate: step towards the closest goal along the grid
+    goal = int(np.flatnonzero(env.rewards > 0)[0])
+    distances = bfs_distances(env.next_state, goal).astype(np.float64)
+    distances[distances < 0] = np.inf
+    best = np.argmin(distances[env.next_state], axis=1)
+    policy = {
+        state: 'exit' if env.terminal[cell] else MOVEMENT_ACTIONS[best[cell]]
+        for cell, state in enumerate(env.cell_states) if not env.walls[cell]
+    }
+    steps = _count_steps(env)
+    agent = TDLearning(env, policy, alpha=0.1, gamma=0.95)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    history = agent.train(episodes, history=MaxDeltaHistory(episodes))
+    wall_time = time.perf_counter() - start
+    return {'build_time': build_time, 'wall_time': wall_time, 'backups': steps[0],
+            'steps': steps[0], 'episodes': episodes,
+            'convergence': episodes_to_converge(history.deltas)}
+
+
+def _control(agent, episodes):
+    lengths = np.zeros(episodes, dtype=np.int64)
+    for episode in range(episodes):
+        _, lengths[episode] = agent.run_episode()
+    return lengths
+
+
+def sarsa(size, seed, episodes):
+    from sarsa_agent import SARSA
+
+    start = time.perf_counter()
+    env = _grid(size, seed)
+    steps = _count_steps(env)
+    agent = SARSA(env, epsilon=0.8, gamma=0.96, alpha=0.5, rng=np.random.default_rng(seed))
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    lengths = _control(agent, episodes)
+    wall_time = time.perf_counter() - start
+    return {'build_time': build_time, 'wall_time': wall_time, 'backups': steps[0],
+            'steps': steps[0], 'episodes': episodes, 'convergence': episodes_to_converge(lengths)}
+
+
+def q_learning(size, seed, episodes):
+    from q_learning import QLearning
+
+    start = time.perf_counter()
+    env = _grid(size, seed)
+    steps = _count_steps(env)
+    agent = QLearning(env, alpha=0.5, gamma=0.96, epsilon=0.8, num_episodes=episodes,
+                      rng=np.random.default_rng(seed))
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    lengths = _control(agent, episodes)
+    wall_time = time.perf_counter() - start
+    return {'build_time': build_time, 'wall_time': wall_time, 'backups': steps[0],
+            'steps': steps[0], 'episodes': episodes, 'convergence': episodes_to_converge(lengths)}
+
+
+def frozenlake_qlearning(size, seed, episodes):
+    import gymnasium as gym
+    from gymnasium.envs.toy_text.frozen_lake import generate_random_map
+    from frozenlake_agents import EpsilonGreedy, Qlearning
+    from random_stream import RandomStream
+
+    start = time.perf_counter()
+    env = gym.make('FrozenLake-v1', is_slippery=False,
+                   desc=generate_random_map(size=size, p=0.9, seed=seed))
+    env.action_space.seed(seed)
+    learner = Qlearning(learning_rate=0.8, gamma=0.95,
+                        state_size=env.observation_space.n, action_size=env.action_space.n)
+    explorer = EpsilonGreedy(epsilon=0.1, rng=RandomStream(np.random.default_rng(seed)))
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lengths = np.zeros(episodes, dtype=np.int64)
+    for episode in range(episodes):
+        state = env.reset(seed=seed)[0]
+        done = False
+        while not done:
+            action = explorer.choose_action(action_space=env.action_space, state=state,
+                                            qtable=learner.qtable)
+            new_state, reward, terminated, truncated, _ = env.step(action)
+            done = terminated or truncated
+            learner.qtable[state, action] = learner.update(state, action, reward, new_state)
+            lengths[episode] += 1
+            state = new_state
+    wall_time = time.perf_counter() - start
+    n_steps = int(lengths.sum())
+    return {'build_time': build_time, 'wall_time': wall_time, 'backups': n_steps,
+            'steps': n_steps, 'episodes': episodes, 'convergence': episodes_to_converge(lengths)}
+
+
+# name -> (class folder, case, default sizes, default episodes)
+CASES = {
+    'value_iteration': ('CLASE_4', value_iteration, [10, 50, 100, 200], 0),
+    'policy_iteration': ('CLASE_4', policy_iteration, [10, 50, 100, 200], 0),
+    'mcm': ('CLASE_5', mcm, [5, 8, 10], 10000),
+    'td_learning': ('CLASE_6', td_learning, [10, 20, 40], 500),
+    'sarsa': ('CLASE_6', sarsa, [5, 8, 12], 500),
+    'q_learning': ('CLASE_7', q_learning, [5, 8, 12], 500),
+    'frozenlake_qlearning': ('CLASE_9', frozenlake_qlearning, [4, 7, 9, 11], 2000),
+}
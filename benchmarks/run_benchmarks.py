@@ -0,0 +1,179 @@
+"""
+Benchmark runner.
+
+Runs every case of cases.CASES for each grid size in its own Python process
+(class folders reuse module names, and peak RSS is per process), then writes
+all results to one JSON file:
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --only sarsa q_learning --sizes 10 20
+    python benchmarks/run_benchmarks.py --baseline baseline.json        # fail on regressions
+    python benchmarks/run_benchmarks.py --output baseline.json          # store a new baseline
+
+Reported per (case, size): wall/build time, backups/sec, env steps/sec,
+convergence (sweeps, iterations or episodes), peak RSS of the process and
+the tracemalloc peak of a second, traced run (tracing slows Python down, so
+the timings come from the untraced run).
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from cases import CASES, ROOT  # noqa: E402
+
+# metric -> True when higher is better
+METRICS = {
+    'backups_per_sec': True,
+    'steps_per_sec': True,
+    'wall_time': False,
+    'peak_rss_mb': False,
+    'tracemalloc_peak_mb': False,
+    'convergence': False,
+}
+
+
+def run_case(name: str, size: int, seed: int, episodes: int, trace_memory: bool = True) -> dict:
+    """Run one case in this process and return its metrics."""
+    folder, case, _, _ = CASES[name]
+    sys.path.insert(0, str(ROOT / folder))
+
+    raw = case(size, seed, episodes)
+    wall_time = raw['wall_time']
+    result = {
+        'case': name, 'size': size, 'seed': seed, **raw,
+        'backups_per_sec': raw['backups'] / wall_time if wall_time > 0 else None,
+        'steps_per_sec': raw['steps'] / wall_time if wall_time > 0 and raw['steps'] else None,
+    }
+
+    if trace_memory:
+        tracemalloc.start()
+        case(size, seed, episodes)
+        result['tracemalloc_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 2 ** 20 if sys.platform == 'darwin' else 2 ** 10
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    return result
+
+
+def _run_in_subprocess(name, size, seed, episodes, trace_memory, timeout):
+    command = [sys.executable, __file__, '--worker', name, str(size),
+               '--seed', str(seed), '--episodes', str(episodes)]
+    if not trace_memory:
+        command.append('--no-tracemalloc')
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout,
+                                   cwd=str(ROOT / CASES[name][0]))
+    except subprocess.TimeoutExpired:
+        return {'case': name, 'size': size, 'seed': seed, 'error': f'timeout ({timeout} s)'}
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'
+        return {'case': name, 'size': size, 'seed': seed, 'error': error}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _metadata() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=str(ROOT)).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results: list, baseline: list, tolerance: float = 0.2) -> list:
+    """
+    Regressions of `results` against `baseline`, matched by (case, size).
+
+    A metric regresses when it is worse than the baseline by more than
+    `tolerance` (relative). Returns (case, size, metric, baseline, current) tuples.
+    """
+    reference = {(r['case'], r['size']): r for r in baseline if 'error' not in r}
+    regressions = []
+    for result in results:
+        base = reference.get((result['case'], result['size']))
+        if base is None or 'error' in result:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = base.get(metric), result.get(metric)
+            if old is None or new is None or old == 0:
+                continue
+            change = (new - old) / abs(old)
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append((result['case'], result['size'], metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=list(CASES), help='cases to run (default: all)')
+    parser.add_argument('--sizes', nargs='+', type=int, help='grid sizes (default: per case)')
+    parser.add_argument('--episodes', type=int, help='episode budget of the learners (default: per case)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='JSON from a previous run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative slack before a regression')
+    parser.add_argument('--timeout', type=float, default=1800, help='seconds per case')
+    parser.add_argument('--no-tracemalloc', action='store_true', help='skip the traced run')
+    parser.add_argument('--worker', nargs=2, metavar=('CASE', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        logger.remove()
+        logger.add(sys.stderr, level='WARNING')
+        name, size = args.worker[0], int(args.worker[1])
+        result = run_case(name, size, args.seed, args.episodes, not args.no_tracemalloc)
+        print(json.dumps(result))
+        return
+
+    results = []
+    for name in args.only or list(CASES):
+        _, _, default_sizes, default_episodes = CASES[name]
+        episodes = args.episodes if args.episodes is not None else default_episodes
+        for size in args.sizes or default_sizes:
+            result = _run_in_subprocess(name, size, args.seed, episodes,
+                                        not args.no_tracemalloc, args.timeout)
+            results.append(result)
+            if 'error' in result:
+                logger.warning(f"{name} {size}x{size}: {result['error']}")
+                continue
+            rate = result['steps_per_sec'] or result['backups_per_sec']
+            logger.info(f"{name} {size}x{size}: {result['wall_time']:.3f} s, "
+                        f"{rate:,.0f} {'pasos' if result['steps_per_sec'] else 'backups'}/s, "
+                        f"convergencia={result['convergence']}, RSS={result['peak_rss_mb']:.0f} MB")
+
+    with open(args.output, 'w') as f:
+        json.dump({'meta': _metadata(), 'results': results}, f, indent=2)
+    logger.info(f"Resultados guardados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for name, size, metric, old, new in regressions:
+            logger.warning(f"Regresion {name} {size}x{size} {metric}: {old:.4g} -> {new:.4g}")
+        if regressions:
+            sys.exit(1)
+        logger.info("Sin regresiones respecto a la linea base")
+
+
+if __name__ == '__main__':
+    main()